@@ -0,0 +1,213 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import nonebot
+from nonebot import get_adapter
+from nonebot.exception import IgnoredException, FinishedException
+from nonebot.adapters.onebot.v11 import Adapter, Bot, GroupMessageEvent
+
+# keep plugin data and config away from the real bot
+_temp_dir = TemporaryDirectory()
+nonebot.init(
+    driver="~none",
+    log_level="WARNING",
+    state_backend="local",
+    whitelist_mode=False,
+    namelist=[],
+    localstore_data_dir=f"{_temp_dir.name}/data",
+    localstore_config_dir=f"{_temp_dir.name}/config",
+    localstore_cache_dir=f"{_temp_dir.name}/cache"
+)
+nonebot.get_driver().register_adapter(Adapter)
+nonebot.load_plugin("nonebot_plugin_group_config")
+nonebot.load_plugins("src/plugins")
+
+from src.kvstore import MemoryStore
+from src.whitelist import is_enabled_group
+from src.plugins import state as state_plugin
+from src.plugins import recorder as recorder_plugin
+from src.plugins.command import Command
+from src.plugins.recorder import MessageRecord, Recorder
+from src.plugins.more_interactions import plus_one_filter
+from src.plugins.ai_chat.utils import generate_message
+
+SELF_ID = 10000
+
+async def _noop():
+    pass
+TEXTS = ["hello", "有人吗", "服务器炸了", "+1", "今天吃什么", "草"]
+
+def make_message(group_id: int, message_id: int, reply_id: int = None):
+    segments = []
+    if reply_id:
+        segments.append({"type": "reply", "data": {"id": str(reply_id)}})
+    if message_id % 7 == 0:
+        segments.append({"type": "at", "data": {"qq": str(20000 + message_id % 50)}})
+    segments.append({"type": "text", "data": {"text": random.choice(TEXTS)}})
+    return {
+        "post_type": "message",
+        "message_type": "group",
+        "sub_type": "normal",
+        "time": int(time.time()),
+        "self_id": SELF_ID,
+        "message_id": message_id,
+        "group_id": group_id,
+        "user_id": 20000 + message_id % 50,
+        "message": segments,
+        "raw_message": "",
+        "font": 0,
+        "sender": {"user_id": 20000 + message_id % 50, "nickname": f"user{message_id % 50}", "card": "", "role": "member"}
+    }
+
+class FakeBot(Bot):
+    history_length = 100
+
+    async def call_api(self, api: str, **data):
+        if api == "get_group_msg_history":
+            base = data["group_id"] * 100000
+            return {"messages": [make_message(data["group_id"], base + i) for i in range(self.history_length)]}
+        if api == "get_group_member_info":
+            return {"card": "", "nickname": f"user{data['user_id']}"}
+        return {}
+
+def run_sync(func, number: int):
+    start = time.perf_counter_ns()
+    for _ in range(number):
+        func()
+    return (time.perf_counter_ns() - start) / number
+
+async def run_async(func, number: int):
+    start = time.perf_counter_ns()
+    for _ in range(number):
+        await func()
+    return (time.perf_counter_ns() - start) / number
+
+async def bench_case(bot: FakeBot, group_count: int, history_length: int, number: int):
+    Recorder._recorders.clear()
+    recorder_plugin.config.recorder_max_history_length = history_length
+    bot.history_length = history_length
+    groups = [100 + i for i in range(group_count)]
+    recorders = [await Recorder.get(group_id, bot) for group_id in groups]
+    events = [GroupMessageEvent(**make_message(
+        random.choice(groups), 10 ** 9 + i, reply_id=groups[0] * 100000 if i % 5 == 0 else None
+    )) for i in range(number)]
+    records = [MessageRecord.from_event(e) for e in events]
+    counter = iter(range(10 ** 9))
+
+    def append():
+        record = records[next(counter) % number]
+        Recorder._recorders[record.group_id].append(record)
+
+    def get_msg():
+        recorder = random.choice(recorders)
+        recorder.get_msg(recorder.group_id * 100000 + random.randrange(history_length))
+
+    def get_reply_msg():
+        Recorder._recorders[groups[0]].get_reply_msg(records[next(counter) % number])
+
+    def delete():
+        recorder = random.choice(recorders)
+        recorder.delete(recorder.group_id * 100000 + random.randrange(history_length))
+
+    def preprocessor():
+        try:
+            is_enabled_group(events[next(counter) % number])
+        except IgnoredException:
+            pass
+
+    command = Command.commands[-1] if Command.commands else Command("bench", _noop)
+
+    def is_enable():
+        command.is_enable(events[next(counter) % number])
+
+    async def check_usage_times():
+        try:
+            await command.check_usage_times(events[next(counter) % number])
+        except FinishedException:
+            pass
+
+    async def plus_one():
+        await plus_one_filter(bot, events[next(counter) % number])
+
+    async def generate():
+        await generate_message(bot, records[next(counter) % number])
+
+    results = {
+        "Recorder.append": run_sync(append, number),
+        "Recorder.get_msg": run_sync(get_msg, number),
+        "Recorder.get_reply_msg": run_sync(get_reply_msg, number),
+        "is_enabled_group": run_sync(preprocessor, number),
+        "Command.is_enable": run_sync(is_enable, number),
+        "Command.check_usage_times": await run_async(check_usage_times, number),
+        "plus_one_filter": await run_async(plus_one, number),
+        "generate_message": await run_async(generate, number),
+        "Recorder.delete": run_sync(delete, number)
+    }
+    return [{
+        "name": name,
+        "group_count": group_count,
+        "history_length": history_length,
+        "ns_per_op": round(ns, 1)
+    } for name, ns in results.items()]
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list[dict], baseline_file: str):
+    with open(baseline_file) as rf:
+        baseline = {(r["name"], r["group_count"], r["history_length"]): r["ns_per_op"]
+                    for r in json.load(rf)["results"]}
+    for r in results:
+        old = baseline.get((r["name"], r["group_count"], r["history_length"]))
+        if old:
+            print(f"{r['name']:28} groups={r['group_count']:<5} history={r['history_length']:<4} "
+                  f"{old:>12.1f} -> {r['ns_per_op']:>12.1f} ns ({r['ns_per_op'] / old:.2f}x)")
+
+async def main():
+    parser = argparse.ArgumentParser(description="per-message overhead benchmarks")
+    parser.add_argument("--groups", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--history", type=int, nargs="+", default=[50, 100, 500])
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--output", help="save results as json")
+    parser.add_argument("--compare", help="compare with a previously saved json")
+    args = parser.parse_args()
+
+    random.seed(0)
+    state_plugin.state.store = MemoryStore()
+    state_plugin.state._save = lambda: None
+    bot = FakeBot(get_adapter(Adapter), str(SELF_ID))
+    results = []
+    for group_count in args.groups:
+        for history_length in args.history:
+            case = await bench_case(bot, group_count, history_length, args.number)
+            for r in case:
+                print(f"{r['name']:28} groups={group_count:<5} history={history_length:<4} {r['ns_per_op']:>12.1f} ns/op")
+            results.extend(case)
+
+    if args.output:
+        with open(args.output, "w") as wf:
+            json.dump({
+                "commit": get_commit(),
+                "python": platform.python_version(),
+                "number": args.number,
+                "results": results
+            }, wf, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import json
+import time
+import asyncio
+import argparse
+from itertools import count
+
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.asyncio.server import ServerConnection, serve
+
+from src.sharding import HashRing
+
+FORWARD_HEADERS = ("x-self-id", "x-client-role", "authorization", "user-agent")
+
+parser = argparse.ArgumentParser(description="按群号将 OneBot V11 反向 WebSocket 连接分发到多个 NoneBot 进程")
+parser.add_argument("workers", nargs="+", help="worker 的反向 WebSocket 地址，如 ws://127.0.0.1:8081/onebot/v11/ws")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8080)
+parser.add_argument("--api-timeout", type=float, default=60, help="未收到响应的 API 请求在多少秒后丢弃")
+
+async def route(onebot_ws: ServerConnection, worker_urls: list[str], api_timeout: float = 60):
+    headers = {k: v for k, v in onebot_ws.request.headers.raw_items() if k.lower() in FORWARD_HEADERS}
+    workers: list[ClientConnection] = [await connect(url, additional_headers=headers) for url in worker_urls]
+    ring = HashRing([str(i) for i in range(len(workers))])
+    pending = dict[str, tuple[int, str, float]]()
+    seq = count()
+
+    async def from_onebot():
+        async for raw in onebot_ws:
+            data: dict = json.loads(raw)
+            if "post_type" not in data:
+                idx, echo, _ = pending.pop(str(data.get("echo")), (None, None, None))
+                if idx is not None:
+                    data["echo"] = echo
+                    await workers[idx].send(json.dumps(data, ensure_ascii=False))
+            elif data["post_type"] == "meta_event":
+                await asyncio.gather(*[ws.send(raw) for ws in workers])
+            elif "group_id" in data:
+                await workers[int(ring.get(data["group_id"]))].send(raw)
+            else:
+                await workers[0].send(raw)
+
+    async def from_worker(idx: int, ws: ClientConnection):
+        async for raw in ws:
+            data: dict = json.loads(raw)
+            now = time.monotonic()
+            # calls onebot never answered, entries are in insertion order so the oldest come first
+            while pending and next(iter(pending.values()))[2] <= now:
+                pending.pop(next(iter(pending)))
+            echo = f"router-{next(seq)}"
+            pending[echo] = (idx, data.get("echo"), now + api_timeout)
+            data["echo"] = echo
+            await onebot_ws.send(json.dumps(data, ensure_ascii=False))
+
+    tasks = [asyncio.create_task(from_onebot())]
+    tasks.extend(asyncio.create_task(from_worker(i, ws)) for i, ws in enumerate(workers))
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*[ws.close() for ws in workers], onebot_ws.close())
+
+async def main():
+    args = parser.parse_args()
+    async with serve(lambda ws: route(ws, args.workers, args.api_timeout), args.host, args.port) as server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    asyncio.run(main())
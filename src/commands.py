@@ -1,14 +1,23 @@
 import re
 import json
+import time
 import asyncio
-from mcstatus import JavaServer
+from typing import TYPE_CHECKING
 
+from nonebot import get_driver, logger
 from nonebot.matcher import Matcher
 from nonebot.params import CommandArg
 from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, Message
-from nonebot_plugin_localstore import get_config_dir
+from nonebot_plugin_localstore import get_config_dir, get_data_dir
+
+from .server_history import ServerHistory
+from .plugins.outbound import Priority, scheduler
+
+if TYPE_CHECKING:
+    from mcstatus.address import Address
 
 config_dir = get_config_dir("command")
+history_dir = get_data_dir("command") / "mc-history"
 
 async def poke(matcher: Matcher, bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
     """
@@ -47,26 +56,126 @@ async def poke(matcher: Matcher, bot: Bot, event: GroupMessageEvent, args: Messa
         await matcher.finish("戳一戳的次数限制在1-5间", reply_message=True)
 
     for _ in range(times):
-        await bot.call_api("group_poke", group_id=event.group_id, user_id=user_id)
-        await asyncio.sleep(0.1)
+        scheduler.submit(
+            event.group_id,
+            lambda: bot.call_api("group_poke", group_id=event.group_id, user_id=user_id),
+            Priority.REPLY
+        )
+
+SERVER_LOOKUP_TTL = 300
+SERVER_PROBE_TIMEOUT = 3
+SERVER_RETRY_BACKOFF = 0.5
+
+_address_cache: dict[str, tuple['Address', float]] = {}
 
-async def _get_server_status(url: str, max_try: int = 3):
-    for _ in range(max_try):
+async def _lookup_server(url: str):
+    # only the SRV lookup is cached, the host is still resolved on connect because
+    # mcstatus sends the connected address in the handshake and proxies route by hostname
+    cached = _address_cache.get(url)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    from mcstatus import JavaServer
+    server = await JavaServer.async_lookup(url, timeout=SERVER_PROBE_TIMEOUT)
+    _address_cache[url] = (server.address, time.monotonic() + SERVER_LOOKUP_TTL)
+    return server.address
+
+async def _get_server_status(url: str, max_try: int = 3, lightweight: bool = False):
+    from mcstatus import JavaServer, LegacyServer
+    for i in range(max_try):
+        if i:
+            await asyncio.sleep(SERVER_RETRY_BACKOFF * 2 ** (i - 1))
         try:
-            return await JavaServer.lookup(url).async_status()
+            address = await asyncio.wait_for(_lookup_server(url), SERVER_PROBE_TIMEOUT)
+            server_cls = LegacyServer if lightweight else JavaServer
+            server = server_cls(address.host, address.port, timeout=SERVER_PROBE_TIMEOUT)
+            return await asyncio.wait_for(server.async_status(), SERVER_PROBE_TIMEOUT)
         except IOError as e:
             if "Received invalid status response packet." in e.args:
                 return True
+            _address_cache.pop(url, None)
         except Exception:
-            continue
+            _address_cache.pop(url, None)
     return False
 
+SERVER_SAMPLE_INTERVAL = 300
+SERVER_HISTORY_CAPACITY = 8064  # 28 days
+
+_histories = dict[str, ServerHistory]()
+
+def _load_servers() -> dict[str, dict[str, str]]:
+    servers_file = config_dir / "mc-servers.json"
+    if not servers_file.exists():
+        return {}
+    with servers_file.open() as rf:
+        return json.load(rf)
+
+def _get_history(server_addr: str):
+    if server_addr not in _histories:
+        filename = re.sub(r"[^\w.-]", "_", server_addr) + ".bin"
+        _histories[server_addr] = ServerHistory(history_dir / filename, SERVER_HISTORY_CAPACITY)
+    return _histories[server_addr]
+
+async def _sample_servers():
+    while True:
+        try:
+            addrs = list({addr for servers in _load_servers().values() for addr in servers.values()})
+            results = await asyncio.gather(*[_get_server_status(addr, max_try=2, lightweight=True)
+                                             for addr in addrs])
+            now = int(time.time())
+            for addr, status in zip(addrs, results):
+                history = _get_history(addr)
+                if isinstance(status, bool):
+                    history.append(now, -1, 0, 0)
+                else:
+                    history.append(now, status.latency, status.players.online, status.players.max)
+                history.save()
+        except Exception as e:
+            logger.error(f"sample servers failed: {e!r}")
+        await asyncio.sleep(SERVER_SAMPLE_INTERVAL)
+
+_sample_task: asyncio.Task = None
+
+@get_driver().on_startup
+async def _():
+    global _sample_task
+    _sample_task = asyncio.create_task(_sample_servers())
+
+def _server_history(servers: dict[str, str], flag: str, args: list[str]):
+    if not args or args[0] not in servers:
+        return "请指定服务器名称"
+    name = args[0]
+    span = args[1] if len(args) > 1 else ("24" if flag == "-h" else "7")
+    if not span.isdigit() or int(span) == 0:
+        return "时间范围必须为正整数"
+    span = int(span)
+    history = _get_history(servers[name])
+    if flag == "-h":
+        stats = history.stats(int(time.time()) - span * 3600)
+        if not stats:
+            return f"{name}近{span}小时无记录"
+        info = f"{name} 近{span}小时状态\n--------------------\n" \
+               f"采样次数：{stats['count']}，在线率{stats['up'] / stats['count']:.0%}"
+        if stats["up"]:
+            info += "\n延迟：最低{:.0f}ms 平均{:.0f}ms 最高{:.0f}ms".format(*stats["latency"]) + \
+                    "\n在线人数：最低{} 平均{:.1f} 最高{}".format(*stats["online"])
+        return info
+    peaks = history.peak_hours(int(time.time()) - span * 86400)
+    if not peaks:
+        return f"{name}近{span}天无记录"
+    info = f"{name} 近{span}天高峰时段\n--------------------"
+    for hour, avg in peaks:
+        info += f"\n{hour:02d}:00-{(hour + 1) % 24:02d}:00 平均{avg:.1f}人在线"
+    return info
+
 async def _server_info(servers: dict[str, str], name_or_ip: str):
     if not name_or_ip:
         return "服务器列表\n--------------------\n" + "\n".join(servers.keys())
+    flag, _, rest = name_or_ip.partition(" ")
+    if flag in ("-h", "-p"):
+        return _server_history(servers, flag, rest.split())
     if name_or_ip == "-a":
         info = "在线服务器状态列表\n--------------------"
-        status_tasks = [_get_server_status(server, max_try=2)
+        status_tasks = [_get_server_status(server, max_try=2, lightweight=True)
                         for server in servers.values()]
         results = list(zip(servers.keys(), await asyncio.gather(*status_tasks)))
         results.sort(key=lambda x: 0 if isinstance(x[1], bool) else x[1].players.online, reverse=True)
@@ -111,10 +220,10 @@ async def server_info(matcher: Matcher, event: GroupMessageEvent, args: Message
     [name|ip|flag]
     获取服务器名称或ip指向的MC服务器信息
     使用 -a 标志获取当前在线服务器信息概览
+    使用 -h <name> [hours=24] 获取服务器近期延迟与在线人数统计
+    使用 -p <name> [days=7] 获取服务器高峰时段
     """
-    with (config_dir / "mc-servers.json").open() as rf:
-        data = json.load(rf)
     await matcher.finish(await _server_info(
-        data.get(str(event.group_id), {}),
+        _load_servers().get(str(event.group_id), {}),
         args.extract_plain_text().lower().strip()
     ), reply_message=True)
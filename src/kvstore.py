@@ -0,0 +1,131 @@
+import sys
+import json
+import time
+import asyncio
+
+IDEMPOTENT_OPS = {"get", "set", "delete"}
+
+class MemoryStore:
+    def __init__(self, data: dict[str, list] = None, purge_interval: float = 60):
+        self.data = data or {}
+        self.purge_interval = purge_interval
+        self._next_purge = 0
+
+    def _alive(self, key: str):
+        item = self.data.get(key)
+        if item and item[1] is not None and item[1] <= time.time():
+            del self.data[key]
+            return
+        return item
+
+    def purge(self):
+        now = time.time()
+        self._next_purge = now + self.purge_interval
+        for key in [k for k, (_, expire) in self.data.items() if expire is not None and expire <= now]:
+            del self.data[key]
+
+    def get(self, key: str, default=None):
+        item = self._alive(key)
+        return item[0] if item else default
+
+    def set(self, key: str, value, ttl: float = None):
+        # keys that are never read again would otherwise only expire on access
+        if time.time() >= self._next_purge:
+            self.purge()
+        self.data[key] = [value, time.time() + ttl if ttl else None]
+
+    def delete(self, key: str):
+        self.data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: float = None):
+        item = self._alive(key)
+        if item:
+            item[0] += amount
+            return item[0]
+        self.set(key, amount, ttl)
+        return amount
+
+    def execute(self, request: dict):
+        op = request["op"]
+        if op == "get":
+            return self.get(request["key"], request.get("default"))
+        if op == "set":
+            return self.set(request["key"], request["value"], request.get("ttl"))
+        if op == "delete":
+            return self.delete(request["key"])
+        if op == "incr":
+            return self.incr(request["key"], request.get("amount", 1), request.get("ttl"))
+        raise ValueError(f"unknown op {op!r}")
+
+class KVClient:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+        self._lock = asyncio.Lock()
+
+    def _reset(self):
+        if self._writer:
+            self._writer.close()
+        self._writer = None
+
+    async def _request(self, request: dict):
+        if not self._writer or self._writer.is_closing() or self._reader.at_eof():
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(json.dumps(request, ensure_ascii=False).encode() + b"\n")
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("kv server closed connection")
+        return json.loads(line)
+
+    async def execute(self, request: dict):
+        async with self._lock:
+            try:
+                response = await self._request(request)
+            except OSError:
+                self._reset()
+                # the request may have been applied before the connection broke
+                if request["op"] not in IDEMPOTENT_OPS:
+                    raise
+                response = await self._request(request)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["value"]
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+async def serve(host: str = "127.0.0.1", port: int = 6380, store: MemoryStore = None):
+    store = store or MemoryStore()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = {"value": store.execute(json.loads(line))}
+                except Exception as e:
+                    response = {"error": repr(e)}
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+async def _main(host: str, port: int):
+    server = await serve(host, port)
+    print(f"kv server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    asyncio.run(_main(
+        sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1",
+        int(sys.argv[2]) if len(sys.argv) > 2 else 6380
+    ))
@@ -1,9 +1,14 @@
-from nonebot import require
+from nonebot import get_driver, require
 
 require("nonebot_plugin_localstore")
 require("nonebot_plugin_group_config")
 
+from src.startup import timed
+
 from .chat import load_models
 from . import handler as _
 
-load_models()
+@get_driver().on_startup
+async def _load_models():
+    with timed(__name__, "init"):
+        load_models()
@@ -0,0 +1,70 @@
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from nonebot import logger
+
+from . import retrieval
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_ignored_pattern = re.compile(r"[\W_]+")
+_question_pattern = re.compile(r"[?？]|吗|什么|怎么|如何|为什么|为啥|哪|谁|多少|几|是否|有没有|能不能|可不可以")
+
+# the hashing embedding scores unrelated short texts as near-identical
+MIN_FUZZY_LENGTH = 6
+
+def normalize_question(text: str):
+    return _ignored_pattern.sub("", unicodedata.normalize("NFKC", text).lower())
+
+def is_question(text: str):
+    return bool(_question_pattern.search(text))
+
+class AnswerCache:
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.entries: OrderedDict[str, tuple[float, 'np.ndarray', list[str]]] = OrderedDict()
+
+    def get(self, question: str, ttl: float, threshold: float):
+        key = normalize_question(question)
+        now = time.time()
+        for k in [k for k, (created, _, _) in self.entries.items() if now - created > ttl]:
+            del self.entries[k]
+        if not key or not self.entries:
+            return
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key][2]
+        if threshold >= 1 or len(key) < MIN_FUZZY_LENGTH:
+            return
+        vec = retrieval.embedding_function(question)
+        score, best = max(
+            ((float(v @ vec), k) for k, (_, v, _) in self.entries.items() if v.shape == vec.shape),
+            default=(0, None)
+        )
+        if score >= threshold:
+            logger.info(f"answer cache similarity: {score:.3f}")
+            self.entries.move_to_end(best)
+            return self.entries[best][2]
+
+    def set(self, question: str, answer: list[str]):
+        key = normalize_question(question)
+        if not key:
+            return
+        self.entries[key] = (time.time(), retrieval.embedding_function(question), answer)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+caches = dict[int, AnswerCache]()
+
+def get_answer_cache(group_id: int):
+    if group_id not in caches:
+        caches[group_id] = AnswerCache()
+    return caches[group_id]
@@ -1,10 +1,21 @@
 import json
 import time
-from openai import AsyncOpenAI, APIStatusError
+import asyncio
+import importlib.util
+from typing import TYPE_CHECKING
 
 from nonebot import logger
 from nonebot_plugin_localstore import get_plugin_config_file
 
+from .structured import (
+    OutputSchema, preprocess_schema, triage_schema, chat_schema,
+    repair_json, validate_preprocess, validate_triage, validate_chat
+)
+
+if TYPE_CHECKING:
+    from httpx import AsyncClient
+    from openai import AsyncOpenAI
+
 chat_prompt = [
     "下文是群聊中的一段消息，你需要结合这些信息来回复新消息",
     "新消息引用链是一个列表，其中第一项是你需要回复的消息，后面的消息依次是新消息所引用的消息",
@@ -31,16 +42,77 @@ chat_prompt = [
     "当群成员询问涉政涉黄请求时，你应该拒绝回答"
 ]
 
+triage_prompt = """下面的每条用户消息都是一个独立群聊的待处理内容，以“第N组”开头标明编号
+请按照上述规则分别独立分析每一组，不要混淆不同组的上下文
+返回一个json对象，results字段为列表，每一项是对应一组的分析结果（字段同上），并额外包含整数id字段表示组编号"""
+
 class ChatModel:
     _providers = dict[str, dict[str, str]]()
-    _clients = dict[str, AsyncOpenAI]()
+    _clients: dict[str, 'AsyncOpenAI'] = {}
+    _http_config = dict[str]()
+    _http_client: 'AsyncClient' = None
+    _background_tasks = set[asyncio.Task]()
     def __init__(self, choices: list[tuple[str, str]]):
         self.choices = choices
 
     @classmethod
-    def set_providers(cls, providers: dict[str, dict[str]]):
+    def _spawn(cls, coro):
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            return
+        cls._background_tasks.add(task)
+        task.add_done_callback(cls._background_tasks.discard)
+
+    @staticmethod
+    async def _close_later(closable, delay: float = 60):
+        await asyncio.sleep(delay)
+        try:
+            await closable.aclose() if hasattr(closable, "aclose") else await closable.close()
+        except Exception as e:
+            logger.warning(f"close client failed: {e!r}")
+
+    @classmethod
+    def set_providers(cls, providers: dict[str, dict[str]], http_config: dict[str] = None):
+        # keep unchanged clients and their warm connections, close the rest after in-flight requests finish
+        http_config = http_config or {}
+        shared = cls._http_config.get("shared", True)
+        if http_config != cls._http_config:
+            stale = set(cls._clients)
+            if cls._http_client:
+                cls._spawn(cls._close_later(cls._http_client))
+            cls._http_config = http_config
+            cls._http_client = None
+        else:
+            stale = {name for name in cls._clients if providers.get(name) != cls._providers.get(name)}
         cls._providers = providers
-        cls._clients = {}
+        for name in stale:
+            client = cls._clients.pop(name)
+            logger.info(f"drop client for {name}")
+            if not shared:
+                cls._spawn(cls._close_later(client))
+
+    @classmethod
+    def get_http_client(cls):
+        if not cls._http_config.get("shared", True):
+            return
+        if cls._http_client is None:
+            import httpx
+            from openai import DefaultAsyncHttpxClient
+            http2 = cls._http_config.get("http2", False)
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("http2 requires the h2 package (pip install httpx[http2]), fall back to http/1.1")
+                http2 = False
+            cls._http_client = DefaultAsyncHttpxClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=cls._http_config.get("max-connections", 100),
+                    max_keepalive_connections=cls._http_config.get("max-keepalive-connections", 20),
+                    keepalive_expiry=cls._http_config.get("keepalive-expiry", 30)
+                )
+            )
+        return cls._http_client
 
     @classmethod
     def get_client(cls, provider_name: str):
@@ -50,31 +122,49 @@ class ChatModel:
                 logger.error(f"provider {provider_name} not found")
                 return
             logger.info(f"create client for {provider_name}")
-            cls._clients[provider_name] = AsyncOpenAI(
+            import openai
+            cls._clients[provider_name] = openai.AsyncOpenAI(
                 api_key=provider["api_key"],
-                base_url=provider.get("base_url", None)
+                base_url=provider.get("base_url", None),
+                http_client=cls.get_http_client()
             )
         return cls._clients[provider_name]
 
+    @classmethod
+    async def warm_up(cls, provider_names: set[str]):
+        async def ping(provider_name: str):
+            if not (client := cls.get_client(provider_name)):
+                return
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(client.models.list(), 10)
+                logger.info(f"warm up {provider_name}: {(time.perf_counter() - start) * 1000:.0f}ms")
+            except Exception as e:
+                logger.warning(f"warm up {provider_name} failed: {e!r}")
+        await asyncio.gather(*map(ping, provider_names))
+
     def iter_client(self):
         for provider_name, model in self.choices:
             client = self.get_client(provider_name)
             if client:
                 logger.info(f"use provider {provider_name!r} for model {model!r}")
-                yield (client, model)
+                yield (provider_name, client, model)
 
-    async def chat(self, messages: list[dict[str]]):
-        for client, model in self.iter_client():
+    async def chat(self, messages: list[dict[str]], schema: OutputSchema = None):
+        from openai import APIStatusError
+        for provider_name, client, model in self.iter_client():
+            kwargs = {"model": model, "messages": messages}
+            if schema and (mode := self._providers[provider_name].get("response-format")):
+                kwargs["response_format"] = schema.response_format(mode)
+                if schema.hint:
+                    kwargs["messages"] = messages + [{"role": "system", "content": schema.hint}]
             try:
-                response = await client.chat.completions.create(
-                    model=model,
-                    messages=messages
-                )
+                response = await client.chat.completions.create(**kwargs)
                 if hasattr(response.choices[0].message, "reasoning_content"):
                     logger.info(f"reasoning content: {response.choices[0].message.reasoning_content}")
                 ans = response.choices[0].message.content
                 if ans:
-                    return ans.removeprefix("```json").removesuffix("```").strip()
+                    return ans.strip()
             except APIStatusError:
                 continue
 
@@ -100,6 +190,14 @@ def load_models():
                 "chat": [
                     ["provider-name", "model"]
                 ]
+            },
+            "http": {
+                "shared": True,
+                "http2": False,
+                "max-connections": 100,
+                "max-keepalive-connections": 20,
+                "keepalive-expiry": 30,
+                "warm-up": False
             }
         }
         with config_file.open("w") as wf:
@@ -107,7 +205,7 @@ def load_models():
         return
     with config_file.open() as rf:
         config: dict[str, dict[str]] = json.load(rf)
-    ChatModel.set_providers(config["providers"])
+    ChatModel.set_providers(config["providers"], config.get("http"))
     preference = config["preference"]
     global chat_model, preprocess_model, image_model, think_model, search_model, gen_image_model
     chat_model = ChatModel(preference["chat"])
@@ -123,26 +221,51 @@ def load_models():
         search_model = ChatModel(preference["search"])
     if "gen-image" in preference:
         gen_image_model = ChatModel(preference["gen-image"])
+    if config.get("http", {}).get("warm-up", False):
+        ChatModel._spawn(ChatModel.warm_up({
+            provider_name for choices in preference.values() for provider_name, _ in choices
+        }))
 
-async def get_preprocess_info(dumped_messages: list[dict[str, str]]) -> dict[str | list[str]]:
-    if not preprocess_model:
-        return
-
+def _get_preprocess_prompt():
     with open("src/preprocess-prompt.md") as rf:
-        messages = [{
+        return [{
             "role": "system",
             "content": rf.read()
         }]
+
+async def get_preprocess_info(dumped_messages: list[dict[str, str]]) -> dict[str | list[str]]:
+    if not preprocess_model:
+        return
+
+    messages = _get_preprocess_prompt()
     messages.extend(dumped_messages)
 
     retry = 3
     while retry:
-        try:
-            return json.loads(await preprocess_model.chat(messages))
-        except Exception:
-            retry -= 1
-            if retry:
-                logger.warning("get preprocess info failed, retrying")
+        ans = await preprocess_model.chat(messages, preprocess_schema)
+        if ans and (info := validate_preprocess(repair_json(ans))):
+            return info
+        retry -= 1
+        if retry:
+            logger.warning("get preprocess info failed, retrying")
+
+async def get_preprocess_batch(batch: list[list[dict[str, str]]]) -> list[dict[str | list[str]]]:
+    if not preprocess_model:
+        return [None] * len(batch)
+
+    messages = _get_preprocess_prompt()
+    messages.append({
+        "role": "system",
+        "content": triage_prompt
+    })
+    messages.extend({
+        "role": "user",
+        "content": f"第{id}组：\n" + "\n".join(msg["content"] for msg in dumped_messages)
+    } for id, dumped_messages in enumerate(batch))
+
+    ans = await preprocess_model.chat(messages, triage_schema)
+    results = validate_triage(repair_json(ans)) if ans else {}
+    return [results.get(id) for id in range(len(batch))]
 
 async def get_image_description(image_data: str, prompt: str):
     if not image_model:
@@ -182,7 +305,8 @@ async def generate_image(prompt: str):
     if not gen_image_model:
         return
 
-    for client, model in gen_image_model.iter_client():
+    from openai import APIStatusError
+    for _, client, model in gen_image_model.iter_client():
         try:
             response = await client.images.generate(
                 model=model,
@@ -239,8 +363,9 @@ async def chat(
         })
     messages.extend(dumped_messages)
 
-    try:
-        return json.loads(await chat_model.chat(messages))
-    except Exception as e:
-        logger.error(f"chat failed: {e.args[0]}")
+    ans = await chat_model.chat(messages, chat_schema)
+    result = validate_chat(repair_json(ans)) if ans else None
+    if result is None:
+        logger.error(f"chat failed: {ans!r}")
         return []
+    return result
@@ -1,22 +1,33 @@
 import asyncio
 
 from nonebot import logger, on_command, on_message
+from nonebot.message import event_preprocessor
 from nonebot.permission import SUPERUSER
 from nonebot.params import Command, CommandArg
 from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, Message, MessageSegment
 from nonebot_plugin_group_config import GroupConfig, GroupConfigManager, GetGroupConfig
 
-from ..recorder import Recorder
+from ..state import state
+from ..recorder import MessageRecord, Recorder
+from ..outbound import Priority, scheduler
 
-from .utils import get_name, image_storage, generate_message, get_dumped_messages, get_image_data, get_file_segment
-from .chat import load_models, get_preprocess_info, get_image_description, search, generate_image, chat
+from .image import image_stats
+from .utils import get_name, image_storage, generate_message, get_dumped_messages, fetch_image_data, get_file_segment, prefetch_message
+from .retrieval import get_index
+from .answer_cache import get_answer_cache, is_question
+from .chat import load_models, get_image_description, search, generate_image, chat
+from .triage import triage
 
 gcm = GroupConfigManager({
     "response-level": "at",
     "min-corresponding-length": 8,
     "max-history-length": 30,
+    "retrieval-top-k": 8,
+    "retrieval-tail-length": 10,
     "prompt": "",
-    "reply-interval": 1.5
+    "reply-interval": 1.5,
+    "answer-cache-ttl": 3600,
+    "answer-cache-threshold": 0.9
 }, "chat")
 
 def _check_is_enable(event: GroupMessageEvent, group_config: GroupConfig = GetGroupConfig(gcm)):
@@ -32,7 +43,8 @@ chat_cmd = on_command(
     aliases={
         ("chat", "clear"),
         ("chat", "prompt"),
-        ("chat", "prompt", "clear")
+        ("chat", "prompt", "clear"),
+        ("chat", "cache", "clear")
     },
     force_whitespace=True,
     priority=0,
@@ -45,9 +57,19 @@ reload_cmd = on_command(
     priority=0,
     block=True
 )
+stats_cmd = on_command(
+    ("chat", "stats"),
+    force_whitespace=True,
+    permission=SUPERUSER,
+    priority=0,
+    block=True
+)
 message_handler = on_message(rule=_check_is_enable, priority=99)
 
-last_clear_msg = dict[int, int]()
+@event_preprocessor
+async def _(bot: Bot, event: GroupMessageEvent, group_config: GroupConfig = GetGroupConfig(gcm)):
+    if _check_is_enable(event, group_config):
+        prefetch_message(bot, event)
 
 @chat_cmd.handle()
 async def _(
@@ -60,10 +82,16 @@ async def _(
         text = """/chat.clear: 清空消息记录
 /chat.prompt: 查看或设置提示词
 /chat.prompt.clear: 清空提示词
-/chat.reload: 重新加载模型（仅限管理员使用）"""
+/chat.cache.clear: 清空问答缓存
+/chat.reload: 重新加载模型（仅限管理员使用）
+/chat.stats: 查看图片处理统计（仅限管理员使用）"""
+    elif cmd == ("chat", "cache", "clear"):
+        get_answer_cache(event.group_id).clear()
+        text = "清空成功"
     else:
-        last_clear_msg[event.group_id] = event.message_id
+        await state.set(f"chat-last-clear:{event.group_id}", event.message_id)
         if cmd == ("chat", "clear"):
+            get_answer_cache(event.group_id).clear()
             text = "清空成功"
         elif cmd == ("chat", "prompt"):
             ipt = args.extract_plain_text().strip()
@@ -71,9 +99,11 @@ async def _(
                 text = f"当前群聊提示词：\n{group_config['prompt']}"
             else:
                 group_config["prompt"] = ipt
+                get_answer_cache(event.group_id).clear()
                 text = "设置成功"
         else:
             group_config["prompt"] = ""
+            get_answer_cache(event.group_id).clear()
             text = "清空成功"
     await chat_cmd.finish(text, reply_message=True)
 
@@ -85,8 +115,26 @@ async def _():
         await reload_cmd.finish(f"重新加载模型失败: {e.args[0]}", reply_message=True)
     await reload_cmd.finish("重新加载模型成功", reply_message=True)
 
+@stats_cmd.handle()
+async def _():
+    await stats_cmd.finish(
+        f"图片处理统计\n处理: {image_stats.processed}张，缓存命中: {image_stats.cache_hits}次\n"
+        f"节省: {image_stats.bytes_saved / 1024:.1f}KiB，耗时: {image_stats.seconds * 1000:.0f}ms",
+        reply_message=True
+    )
+
 uin_range: list[dict[str, str]] = None
 
+def send_response(bot: Bot, event: GroupMessageEvent, response: list[str | MessageSegment], interval: float):
+    for i, msg in enumerate(response):
+        scheduler.submit(
+            event.group_id,
+            lambda msg=msg, reply=(i == 0 and isinstance(msg, str)): bot.send(event, msg, reply_message=reply),
+            Priority.REPLY,
+            key=event.message_id,
+            delay=interval * i
+        )
+
 @message_handler.handle()
 async def _(bot: Bot, event: GroupMessageEvent, group_config: GroupConfig = GetGroupConfig(gcm)):
     global uin_range
@@ -96,29 +144,59 @@ async def _(bot: Bot, event: GroupMessageEvent, group_config: GroupConfig = GetG
         logger.info(f"ignore robot message: {event.user_id}")
         return
     recorder = await Recorder.get(event.group_id, bot)
+    question = event.message.extract_plain_text().strip()
+    # only questions or messages addressed to the bot, a hit skips the desire check
+    cacheable = group_config["answer-cache-ttl"] > 0 and question and not event.reply \
+        and (event.is_tome() or is_question(question)) \
+        and not any(seg.type == "image" for seg in event.message)
+    if cacheable and (answer := get_answer_cache(event.group_id).get(
+        question, group_config["answer-cache-ttl"], group_config["answer-cache-threshold"]
+    )):
+        logger.info(f"answer cache hit: {question!r}")
+        send_response(bot, event, answer, group_config["reply-interval"])
+        return
     image_storage.clear()
     new_messages = list[str]()
-    e = event
+    e = recorder.get_msg(event.message_id) or MessageRecord.from_event(event)
     while e:
         new_messages.append(await generate_message(bot, e, try_read_file=True))
         e = recorder.get_reply_msg(e)
     history_messages = list[str]()
+    related_messages = list[str]()
+    last_clear_msg = await state.get(f"chat-last-clear:{event.group_id}")
+    top_k = group_config["retrieval-top-k"]
+    if top_k > 0:
+        max_length = group_config["retrieval-tail-length"]
+    else:
+        max_length = group_config["max-history-length"]
+    index = get_index(event.group_id) if top_k > 0 else None
+    oldest_msg = None
     for e in recorder.msg_history[::-1]:
-        if e == event:
+        if e.message_id == event.message_id:
             continue
-        if e.message_id == last_clear_msg.get(event.group_id):
+        if e.message_id == last_clear_msg:
+            top_k = 0
             break
-        if len(history_messages) >= group_config["max-history-length"]:
+        if len(history_messages) >= max_length:
             break
         history_messages.insert(0, await generate_message(bot, e))
-    logger.info(f"current history length: {len(history_messages)}")
+        if index is not None and e.message_id in index:
+            oldest_msg = e.message_id
+    if top_k > 0:
+        related_messages = index.search(
+            event.original_message.extract_plain_text(),
+            top_k,
+            after_id=last_clear_msg,
+            before_id=oldest_msg or event.message_id
+        )
+    logger.info(f"current history length: {len(history_messages)}, related: {len(related_messages)}")
 
     dumped_messages = get_dumped_messages(
         await bot.get_group_info(group_id=event.group_id),
         await get_name(bot, event.group_id, bot.self_id),
-        history_messages, new_messages
+        history_messages, new_messages, related_messages
     )
-    preprocess_info = await get_preprocess_info(dumped_messages)
+    preprocess_info = await triage(dumped_messages, urgent=event.is_tome())
     if not preprocess_info:
         logger.warning("get preprocess info failed")
         return
@@ -131,13 +209,18 @@ async def _(bot: Bot, event: GroupMessageEvent, group_config: GroupConfig = GetG
     logger.info(f"reason: {preprocess_info['reason']}")
     if preprocess_info["desire"] < desire_threshold or not recorder.get_msg(event.message_id):
         if event.is_tome():
-            await bot.group_poke(group_id=event.group_id, user_id=event.user_id)
+            scheduler.submit(
+                event.group_id,
+                lambda: bot.group_poke(group_id=event.group_id, user_id=event.user_id),
+                Priority.REPLY,
+                key=event.message_id
+            )
         return
 
     image_desc = []
     for id, prompt in preprocess_info["images"].items():
         try:
-            image_data = get_image_data(image_storage[id])
+            image_data = await fetch_image_data(image_storage[id])
             if not image_data:
                 continue
             description = await get_image_description(image_data, prompt)
@@ -151,7 +234,12 @@ async def _(bot: Bot, event: GroupMessageEvent, group_config: GroupConfig = GetG
     ) if res]
     think = preprocess_info["think"]
     if think:
-        await bot.send(event, "🤔", reply_message=True)
+        scheduler.submit(
+            event.group_id,
+            lambda: bot.send(event, "🤔", reply_message=True),
+            Priority.REPLY,
+            key=event.message_id
+        )
     response = []
     for msg in await chat(dumped_messages, group_config["prompt"], image_desc, search_info, think):
         if isinstance(msg, str):
@@ -175,10 +263,13 @@ async def _(bot: Bot, event: GroupMessageEvent, group_config: GroupConfig = GetG
     response = [msg for msg in response if msg]
 
     if not (response and recorder.get_msg(event.message_id)):
-        await bot.group_poke(group_id=event.group_id, user_id=event.user_id)
+        scheduler.submit(
+            event.group_id,
+            lambda: bot.group_poke(group_id=event.group_id, user_id=event.user_id),
+            Priority.REPLY,
+            key=event.message_id
+        )
         return
-    interval = group_config["reply-interval"]
-    await bot.send(event, response[0], reply_message=isinstance(response[0], str))
-    for msg in response[1:]:
-        await asyncio.sleep(interval)
-        await bot.send(event, msg)
+    if cacheable and not preprocess_info["search"] and all(isinstance(msg, str) for msg in response):
+        get_answer_cache(event.group_id).set(question, response)
+    send_response(bot, event, response, group_config["reply-interval"])
@@ -0,0 +1,85 @@
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pydantic import BaseModel
+
+from nonebot import get_plugin_config, logger
+
+class Config(BaseModel):
+    chat_image_max_edge: int = 1024
+    chat_image_format: str = "webp"
+    chat_image_quality: int = 80
+    chat_image_min_bytes: int = 65536
+    chat_image_cache_size: int = 64
+
+config = get_plugin_config(Config)
+
+class ImageStats:
+    def __init__(self):
+        self.processed = 0
+        self.cache_hits = 0
+        self.bytes_saved = 0
+        self.seconds = 0.0
+
+image_stats = ImageStats()
+_cache = OrderedDict[str, tuple[bytes, str]]()
+_lock = threading.Lock()
+_pillow_missing = False
+
+def _convert(content: bytes, content_type: str):
+    global _pillow_missing
+    try:
+        from PIL import Image
+    except ImportError:
+        if not _pillow_missing:
+            logger.warning("Pillow is not installed, images are sent without preprocessing")
+            _pillow_missing = True
+        return content, content_type
+
+    try:
+        image = Image.open(io.BytesIO(content))
+    except Exception:
+        return content, content_type
+    max_edge = config.chat_image_max_edge
+    animated = getattr(image, "is_animated", False)
+    if not animated and len(content) < config.chat_image_min_bytes and max(image.size) <= max_edge:
+        return content, content_type
+    image.seek(0)
+    fmt = config.chat_image_format.upper()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        image = image.convert("RGBA")
+        if fmt == "JPEG":
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+    else:
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, quality=config.chat_image_quality)
+    if not animated and buffer.tell() >= len(content):
+        return content, content_type
+    return buffer.getvalue(), f"image/{fmt.lower()}"
+
+def preprocess_image(content: bytes, content_type: str):
+    digest = hashlib.sha1(content).hexdigest()
+    with _lock:
+        if cached := _cache.get(digest):
+            _cache.move_to_end(digest)
+            image_stats.cache_hits += 1
+            return cached
+    start = time.perf_counter()
+    result = _convert(content, content_type)
+    elapsed = time.perf_counter() - start
+    with _lock:
+        image_stats.processed += 1
+        image_stats.bytes_saved += len(content) - len(result[0])
+        image_stats.seconds += elapsed
+        _cache[digest] = result
+        while len(_cache) > config.chat_image_cache_size:
+            _cache.popitem(last=False)
+    logger.info(f"preprocess image: {len(content)} -> {len(result[0])} bytes in {elapsed * 1000:.1f}ms")
+    return result
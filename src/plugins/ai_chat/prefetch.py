@@ -0,0 +1,40 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+class PrefetchCache:
+    def __init__(self, size: int, budget: float):
+        self.size = size
+        self.budget = budget
+        self.tasks = OrderedDict[Hashable, asyncio.Task]()
+
+    def start(self, key: Hashable, coro: Awaitable):
+        if key in self.tasks:
+            coro.close()
+            return
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.tasks[key] = task
+        asyncio.get_running_loop().call_later(self.budget, self._expire, key, task)
+        while len(self.tasks) > self.size:
+            _, old_task = self.tasks.popitem(last=False)
+            old_task.cancel()
+
+    def _expire(self, key: Hashable, task: asyncio.Task):
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        task.cancel()
+
+    async def fetch(self, key: Hashable, factory: Callable[[], Awaitable[Any]]):
+        task = self.tasks.get(key)
+        if task and not task.cancelled():
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            except Exception:
+                pass
+        return await factory()
+
+prefetcher = PrefetchCache(size=128, budget=30)
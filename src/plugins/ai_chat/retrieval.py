@@ -0,0 +1,119 @@
+import re
+import time
+import zlib
+from typing import TYPE_CHECKING, Callable
+
+from ..recorder import MessageRecord, Recorder
+
+from .utils import TIMEZONE
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_token_pattern = re.compile(r"[a-z0-9_]+|[^\x00-\x7f\W]+")
+
+def _features(text: str):
+    for token in _token_pattern.findall(text.lower()):
+        if token.isascii() or len(token) == 1:
+            yield token
+        else:
+            yield from (token[i:i+2] for i in range(len(token) - 1))
+
+def hashing_embedding(text: str, dim: int = 512) -> 'np.ndarray':
+    import numpy as np
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode())
+        vec[h % dim] += 1 if h & 0x80000000 else -1
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+embedding_function: Callable[[str], 'np.ndarray'] = hashing_embedding
+
+def set_embedding_function(func: Callable[[str], 'np.ndarray']):
+    global embedding_function
+    embedding_function = func
+    group_ids = list(indexes)
+    indexes.clear()
+    for group_id in group_ids:
+        get_index(group_id)
+
+class VectorIndex:
+    def __init__(self, capacity: int = 2000):
+        self.capacity = capacity
+        self.vectors: 'np.ndarray' = None
+        self.ids = list[int]()
+        self.texts = list[str]()
+
+    def add(self, message_id: int, text: str, content: str):
+        import numpy as np
+        vec = embedding_function(content)
+        n = len(self.ids)
+        if self.vectors is None:
+            self.vectors = np.zeros((min(64, self.capacity), vec.shape[0]), dtype=np.float32)
+        elif n == self.capacity:
+            drop = self.capacity // 10
+            self.vectors[:-drop] = self.vectors[drop:]
+            del self.ids[:drop], self.texts[:drop]
+        elif n == len(self.vectors):
+            vectors = np.zeros((min(n * 2, self.capacity), vec.shape[0]), dtype=np.float32)
+            vectors[:n] = self.vectors
+            self.vectors = vectors
+        self.vectors[len(self.ids)] = vec
+        self.ids.append(message_id)
+        self.texts.append(text)
+
+    def __contains__(self, message_id: int):
+        return message_id in self.ids
+
+    def remove(self, message_id: int):
+        if message_id not in self.ids:
+            return
+        idx = self.ids.index(message_id)
+        n = len(self.ids)
+        self.vectors[idx:n-1] = self.vectors[idx+1:n]
+        del self.ids[idx], self.texts[idx]
+
+    def _position(self, message_id: int, default: int):
+        try:
+            return self.ids.index(message_id)
+        except ValueError:
+            return default
+
+    def search(self, query: str, k: int, after_id: int = None, before_id: int = None, min_score: float = 0.1):
+        start = self._position(after_id, -1) + 1
+        end = self._position(before_id, len(self.ids))
+        if k <= 0 or end <= start:
+            return []
+        import numpy as np
+        scores = self.vectors[start:end] @ embedding_function(query)
+        top = np.argsort(-scores)[:k]
+        return [self.texts[start + i] for i in sorted(top) if scores[i] >= min_score]
+
+indexes = dict[int, VectorIndex]()
+
+def _add_record(index: VectorIndex, record: MessageRecord):
+    content = record.message.extract_plain_text().strip()
+    if not content:
+        return
+    format_time = time.strftime("%H:%M:%S", time.gmtime(record.time + TIMEZONE))
+    index.add(record.message_id, f"[{format_time} {record.sender_name}]\n{content}", content)
+
+def get_index(group_id: int):
+    # built on first use so only groups where chat actually runs pay for an index
+    if group_id not in indexes:
+        indexes[group_id] = VectorIndex()
+        if recorder := Recorder._recorders.get(group_id):
+            for record in recorder.msg_history:
+                _add_record(indexes[group_id], record)
+    return indexes[group_id]
+
+def _on_append(group_id: int, record: MessageRecord):
+    if group_id in indexes:
+        _add_record(indexes[group_id], record)
+
+def _on_delete(group_id: int, message_id: int):
+    if group_id in indexes:
+        indexes[group_id].remove(message_id)
+
+Recorder.add_listener(_on_append, _on_delete)
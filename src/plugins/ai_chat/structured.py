@@ -0,0 +1,180 @@
+import re
+import ast
+import json
+from itertools import islice
+
+class OutputSchema:
+    def __init__(self, name: str, schema: dict[str], hint: str = None):
+        self.name = name
+        self.schema = schema
+        self.hint = hint
+
+    def response_format(self, mode: str):
+        if mode == "json_schema":
+            return {"type": "json_schema", "json_schema": {"name": self.name, "schema": self.schema}}
+        if mode == "json_object":
+            return {"type": "json_object"}
+
+preprocess_schema = OutputSchema("preprocess", {
+    "type": "object",
+    "properties": {
+        "reason": {"type": "string"},
+        "desire": {"type": "integer", "minimum": 0, "maximum": 20},
+        "images": {"type": "object", "additionalProperties": {"type": "string"}},
+        "search": {"type": "array", "items": {"type": "string"}},
+        "think": {"type": "boolean"}
+    },
+    "required": ["reason", "desire", "images", "search", "think"]
+})
+
+triage_schema = OutputSchema("triage", {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, **preprocess_schema.schema["properties"]},
+                "required": ["id", *preprocess_schema.schema["required"]]
+            }
+        }
+    },
+    "required": ["results"]
+})
+
+chat_schema = OutputSchema("chat", {
+    "type": "object",
+    "properties": {
+        "messages": {
+            "type": "array",
+            "items": {"anyOf": [{"type": "string"}, {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": ["text", "image", "file"]},
+                    "content": {"type": "string"},
+                    "filename": {"type": "string"}
+                },
+                "required": ["type", "content"]
+            }]}
+        }
+    },
+    "required": ["messages"]
+}, "请将回复列表放在json对象的messages字段中返回")
+
+_fence_pattern = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S)
+_trailing_comma_pattern = re.compile(r",\s*([}\]])")
+_literal_pattern = re.compile(r'("(?:\\.|[^"\\])*")|\b(true|false|null)\b')
+_closers = {"{": "}", "[": "]"}
+_start_pattern = re.compile(r"[{\[]")
+_decoder = json.JSONDecoder()
+
+def _candidates(text: str):
+    text = text.strip()
+    if match := _fence_pattern.search(text):
+        yield match.group(1).strip()
+    yield text
+
+def _balance(text: str):
+    stack = list[str]()
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _closers:
+            stack.append(_closers[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+    return text + ('"' if in_string else "") + "".join(reversed(stack))
+
+def _to_python_literal(text: str):
+    return _literal_pattern.sub(
+        lambda m: m.group(1) or {"true": "True", "false": "False", "null": "None"}[m.group(2)],
+        text
+    )
+
+def repair_json(text: str):
+    for candidate in _candidates(text):
+        for match in islice(_start_pattern.finditer(candidate), 8):
+            # close whatever a truncated reply left open, raw_decode then ignores any trailing text
+            balanced = _balance(candidate[match.start():])
+            for fixed in (balanced, _trailing_comma_pattern.sub(r"\1", balanced)):
+                try:
+                    return _decoder.raw_decode(fixed)[0]
+                except ValueError:
+                    pass
+            try:
+                return ast.literal_eval(_to_python_literal(fixed))
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                pass
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1", "是")
+    return bool(value)
+
+def validate_preprocess(data) -> dict[str]:
+    if not isinstance(data, dict):
+        return
+    try:
+        desire = int(float(data.get("desire")))
+    except (TypeError, ValueError):
+        return
+    images = data.get("images") or {}
+    if isinstance(images, list):
+        images = {i: "" for i in images}
+    if not isinstance(images, dict):
+        images = {}
+    search = data.get("search") or []
+    if isinstance(search, str):
+        search = [search]
+    if not isinstance(search, list):
+        search = []
+    return {
+        "reason": str(data.get("reason", "")),
+        "desire": min(max(desire, 0), 20),
+        "images": {str(k): str(v) for k, v in images.items()},
+        "search": [str(i) for i in search if i],
+        "think": _to_bool(data.get("think", False))
+    }
+
+def validate_triage(data) -> dict[int, dict[str]]:
+    if isinstance(data, dict):
+        data = data.get("results")
+    if not isinstance(data, list):
+        return {}
+    results = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            id = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        if info := validate_preprocess(item):
+            results[id] = info
+    return results
+
+def validate_chat(data) -> list[str | dict[str, str]]:
+    if isinstance(data, dict):
+        data = data.get("messages", [data] if "type" in data else None)
+    if isinstance(data, str):
+        data = [data]
+    if not isinstance(data, list):
+        return
+    messages = []
+    for msg in data:
+        if isinstance(msg, str):
+            messages.append(msg)
+        elif isinstance(msg, dict) and msg.get("type") in ("text", "image", "file") \
+                and isinstance(msg.get("content"), str):
+            if msg["type"] == "file" and not msg.get("filename"):
+                continue
+            messages.append(msg)
+    return messages
@@ -0,0 +1,78 @@
+import asyncio
+from pydantic import BaseModel
+
+from nonebot import get_plugin_config, logger
+
+from .chat import get_preprocess_info, get_preprocess_batch
+
+class Config(BaseModel):
+    chat_triage_batch: bool = False
+    chat_triage_tick: float = 0.5
+    chat_triage_max_batch: int = 8
+
+config = get_plugin_config(Config)
+
+class TriageBatcher:
+    def __init__(self, tick: float, max_batch: int):
+        self.tick = tick
+        self.max_batch = max_batch
+        self.pending = list[tuple[list[dict[str, str]], asyncio.Future]]()
+        self._worker: asyncio.Task = None
+        self._tasks = set[asyncio.Task]()
+
+    def submit(self, dumped_messages: list[dict[str, str]]):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((dumped_messages, future))
+        if len(self.pending) >= self.max_batch:
+            self._flush()
+        elif self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return future
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _flush(self):
+        while self.pending:
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            self._spawn(self._process(batch))
+
+    async def _run(self):
+        while self.pending:
+            await asyncio.sleep(self.tick)
+            self._flush()
+
+    async def _fallback(self, dumped_messages: list[dict[str, str]], future: asyncio.Future):
+        try:
+            info = await get_preprocess_info(dumped_messages)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(info)
+
+    async def _process(self, batch: list[tuple[list[dict[str, str]], asyncio.Future]]):
+        results = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                results = await get_preprocess_batch([dumped_messages for dumped_messages, _ in batch])
+            except Exception as e:
+                logger.warning(f"triage batch failed: {e!r}")
+            logger.info(f"triage batch: {sum(map(bool, results))}/{len(batch)} decided")
+        for (dumped_messages, future), info in zip(batch, results):
+            if future.done():
+                continue
+            if info:
+                future.set_result(info)
+            else:
+                self._spawn(self._fallback(dumped_messages, future))
+
+triage_batcher = TriageBatcher(config.chat_triage_tick, config.chat_triage_max_batch)
+
+async def triage(dumped_messages: list[dict[str, str]], urgent: bool = False):
+    if not config.chat_triage_batch or urgent:
+        return await get_preprocess_info(dumped_messages)
+    return await triage_batcher.submit(dumped_messages)
@@ -1,30 +1,41 @@
 import time
 import json
+import asyncio
 import base64
 import random
-import requests
 
+from nonebot import logger
 from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, MessageSegment
 
+from ..recorder import MessageRecord
+
+from .image import preprocess_image
+from .prefetch import prefetcher
+
 TIMEZONE = 28800  # UTC+8
 
-async def get_name(bot: Bot, group_id: int, user_id: int) -> str:
+async def _get_name(bot: Bot, group_id: int, user_id: int) -> str:
     info = await bot.get_group_member_info(group_id=group_id, user_id=user_id)
     return info["card"] or info["nickname"]
 
+async def get_name(bot: Bot, group_id: int, user_id: int) -> str:
+    return await prefetcher.fetch(
+        ("name", group_id, int(user_id)),
+        lambda: _get_name(bot, group_id, user_id)
+    )
+
 image_storage = dict[str, str]()
 
-async def generate_message(bot: Bot, event: GroupMessageEvent, try_read_file: bool = False) -> str:
-    format_time = time.strftime("%H:%M:%S", time.gmtime(event.time + TIMEZONE))
-    sender_name = event.sender.card or event.sender.nickname
+async def generate_message(bot: Bot, record: MessageRecord, try_read_file: bool = False) -> str:
+    format_time = time.strftime("%H:%M:%S", time.gmtime(record.time + TIMEZONE))
     content = ""
-    for msg_seg in event.original_message:
+    for msg_seg in record.message:
         if msg_seg.type == "text":
             content += msg_seg.data["text"]
         elif msg_seg.type == "at":
             user_id: str = msg_seg.data["qq"]
             if user_id.isdigit():
-                content += "@" + await get_name(bot, event.group_id, user_id)
+                content += "@" + await get_name(bot, record.group_id, user_id)
             else:
                 content += "@全体成员"
         elif msg_seg.type == "image":
@@ -48,30 +59,59 @@ async def generate_message(bot: Bot, event: GroupMessageEvent, try_read_file: bo
                     pass
             name = msg_seg.data["file"]
             content += f"[文件-{name}]"
-    role_prefix = "{管理员}" if event.sender.role == "admin" else ""
-    return f"{role_prefix}[{format_time} {sender_name}]\n{content}"
+    role_prefix = "{管理员}" if record.role == "admin" else ""
+    return f"{role_prefix}[{format_time} {record.sender_name}]\n{content}"
 
-def get_dumped_messages(group_info: dict[str], name: str, history_messages: list[str], new_messages: list[str]):
-    return [{
-        "role": "user",
-        "content": i
-    } for i in (
+def get_dumped_messages(
+        group_info: dict[str],
+        name: str,
+        history_messages: list[str],
+        new_messages: list[str],
+        related_messages: list[str] = None
+    ):
+    contents = [
         f"你的名字是{name}",
         f"群聊名称：{group_info['group_name']} ({group_info['member_count']}人)",
         f"历史消息：{json.dumps(history_messages, ensure_ascii=False)}",
         f"新消息及引用消息链：{json.dumps(new_messages, ensure_ascii=False)}"
-    )]
+    ]
+    if related_messages:
+        contents.insert(2, f"与新消息相关的较早消息：{json.dumps(related_messages, ensure_ascii=False)}")
+    return [{
+        "role": "user",
+        "content": i
+    } for i in contents]
 
-def get_image_data(url: str):
-    res = requests.get(url)
+async def get_image_data(url: str):
+    # an async request so that cancelling an expired prefetch also stops the download
+    import httpx
+    async with httpx.AsyncClient(follow_redirects=True) as client:
+        res = await client.get(url)
     if res.status_code != 200:
         return
-    content_type = res.headers["Content-Type"]
+    content_type = res.headers.get("Content-Type", "")
     if not content_type.startswith("image/"):
         return
-    b64 = base64.b64encode(res.content).decode()
+    content, content_type = await asyncio.to_thread(preprocess_image, res.content, content_type)
+    b64 = base64.b64encode(content).decode()
     return f"data:{content_type};base64,{b64}"
 
+async def fetch_image_data(url: str):
+    return await prefetcher.fetch(("image", url), lambda: get_image_data(url))
+
+def prefetch_message(bot: Bot, event: GroupMessageEvent):
+    # runs inside an event preprocessor, where any exception would drop the event for every plugin
+    try:
+        prefetcher.start(("name", event.group_id, int(bot.self_id)), _get_name(bot, event.group_id, bot.self_id))
+        for msg_seg in event.original_message:
+            if msg_seg.type == "at" and str(msg_seg.data.get("qq", "")).isdigit():
+                user_id = int(msg_seg.data["qq"])
+                prefetcher.start(("name", event.group_id, user_id), _get_name(bot, event.group_id, user_id))
+            elif msg_seg.type == "image" and not msg_seg.data.get("summary") and (url := msg_seg.data.get("url")):
+                prefetcher.start(("image", url), get_image_data(url))
+    except Exception as e:
+        logger.warning(f"prefetch message {event.message_id} failed: {e!r}")
+
 def get_file_segment(filename: str, content: bytes):
     b64file = base64.b64encode(content).decode()
     return MessageSegment("file", {
@@ -11,12 +11,11 @@ from nonebot.params import CommandArg, Depends
 from nonebot.adapters.onebot.v11 import GroupMessageEvent, Message
 from nonebot_plugin_localstore import get_plugin_config_file
 
+from .state import state
+
 ec_file = get_plugin_config_file("enable-commands.json")
 if not ec_file.exists():
     ec_file.write_text("{}")
-usage_times_dir = get_plugin_config_file("usage_times")
-if not usage_times_dir.exists():
-    usage_times_dir.mkdir(parents=True)
 
 class Command:
     commands = list['Command']()
@@ -47,19 +46,9 @@ class Command:
         return self.name in enable_commands.get(str(event.group_id), [])
 
     async def check_usage_times(self, event: GroupMessageEvent):
-        times_file = usage_times_dir / time.strftime("%Y%m%d.json")
-        times: dict[str, dict[str, int]]
-        if times_file.exists():
-            times = json.loads(times_file.read_text())
-        else:
-            times = {}
-        times.setdefault(self.name, {})
-        session_id = event.get_session_id()
-        times[self.name].setdefault(session_id, 0)
-        if times[self.name][session_id] >= self.max_usage_times:
+        key = f"usage-times:{time.strftime('%Y%m%d')}:{self.name}:{event.get_session_id()}"
+        if await state.incr(key, ttl=86400) > self.max_usage_times:
             await self.command_handler.finish(f"命令已达到最大使用次数，每日使用次数为{self.max_usage_times}次", reply_message=True)
-        times[self.name][session_id] += 1
-        times_file.write_text(json.dumps(times, indent=4))
 
 help_cmd = on_command(
     "help",
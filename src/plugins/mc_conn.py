@@ -1,4 +1,6 @@
 import re
+import time
+import asyncio
 from pydantic import BaseModel
 
 from nonebot import get_bot, get_plugin_config, logger, on_command, on_type
@@ -16,12 +18,22 @@ from nonebot.adapters.minecraft import (
     BaseJoinEvent
 )
 
+from .state import state
+from .outbound import Priority, scheduler
+
 class Config(BaseModel):
     mc_conn_onebot: int
     mc_conn_config: dict[str, list[str]]
+    mc_conn_coalesce: dict[str, float] = {}
+    mc_conn_rcon_cache_ttl: float = 2
 
 config = get_plugin_config(Config)
 
+server_groups = dict[str, list[str]]()
+for group_id, servers in config.mc_conn_config.items():
+    for server_name in servers:
+        server_groups.setdefault(server_name, []).append(group_id)
+
 def is_in_group(event: GroupMessageEvent):
     return str(event.group_id) in config.mc_conn_config
 
@@ -42,29 +54,95 @@ async def send_to_qq(server_name: str, username: str, message: str):
     except:
         logger.warning("OneBot not found")
         return
-    for group_id in config.mc_conn_config:
-        if server_name in config.mc_conn_config[group_id]:
-            await onebot.send_group_msg(
-                group_id=group_id,
-                message=f"<{server_name}{username}> " + message
-            )
+    message = f"<{server_name}{username}> " + message
+    await asyncio.gather(*[scheduler.submit(
+        group_id,
+        lambda group_id=group_id: onebot.send_group_msg(group_id=group_id, message=message),
+        Priority.RELAY
+    ) for group_id in server_groups.get(server_name, [])], return_exceptions=True)
+
+pending_notices = dict[str, list[tuple[str, str]]]()
+flush_tasks = set[asyncio.Task]()
+
+def _format_notice(kind: str, content: str):
+    return f"{content} 加入了游戏" if kind == "join" else content
+
+async def _flush_notices(server_name: str):
+    await asyncio.sleep(config.mc_conn_coalesce[server_name])
+    notices = pending_notices.pop(server_name)
+    if len(notices) == 1:
+        await send_to_qq(server_name, "", _format_notice(*notices[0]))
+        return
+    joins = [content for kind, content in notices if kind == "join"]
+    deaths = [content for kind, content in notices if kind == "death"]
+    lines = []
+    if joins:
+        lines.append(f"{len(joins)}人加入了游戏: {', '.join(joins)}")
+    if deaths:
+        lines.append(f"{len(deaths)}条死亡消息:")
+        lines.extend(deaths)
+    await send_to_qq(server_name, "", "\n".join(lines))
+
+async def send_notice(server_name: str, kind: str, content: str):
+    if config.mc_conn_coalesce.get(server_name, 0) <= 0:
+        await send_to_qq(server_name, "", _format_notice(kind, content))
+        return
+    if server_name not in pending_notices:
+        pending_notices[server_name] = []
+        task = asyncio.create_task(_flush_notices(server_name))
+        flush_tasks.add(task)
+        task.add_done_callback(flush_tasks.discard)
+    pending_notices[server_name].append((kind, content))
 
 @mc_msg_handler.handle()
 async def _(bot: MCBot, event: BaseChatEvent):
     text = event.get_plaintext()[1:]
     if text:
         await send_to_qq(event.server_name, " " + event.player.nickname, text)
-        await bot.send_rcon_cmd(command=f"msg {event.player.nickname} 消息已发送")
+        await send_rcon(bot, f"msg {event.player.nickname} 消息已发送")
 
 @mc_death_handler.handle()
 async def _(event: BaseDeathEvent):
     if not event.player.nickname.startswith("bot_"):
-        await send_to_qq(event.server_name, "", event.message)
+        await send_notice(event.server_name, "death", event.message)
 
 @mc_join_handler.handle()
 async def _(event: BaseJoinEvent):
     if not event.player.nickname.startswith("bot_"):
-        await send_to_qq(event.server_name, "", f"{event.player.nickname} 加入了游戏")
+        await send_notice(event.server_name, "join", event.player.nickname)
+
+rcon_cache = dict[tuple[str, str], tuple[float, list[str]]]()
+rcon_inflight = dict[tuple[str, str], asyncio.Task]()
+rcon_locks = dict[str, asyncio.Lock]()
+
+async def _send_rcon_cmd(mcbot: MCBot, command: str):
+    # the adapter sends every command over one rcon socket without matching replies to requests
+    if mcbot.self_id not in rcon_locks:
+        rcon_locks[mcbot.self_id] = asyncio.Lock()
+    async with rcon_locks[mcbot.self_id]:
+        return await mcbot.send_rcon_cmd(command=command)
+
+async def send_rcon(mcbot: MCBot, command: str, cache: bool = False):
+    if not cache:
+        return await _send_rcon_cmd(mcbot, command)
+    key = (mcbot.self_id, command)
+    cached = rcon_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    if key not in rcon_inflight:
+        def on_done(task: asyncio.Task):
+            rcon_inflight.pop(key, None)
+            if not task.cancelled() and not task.exception():
+                now = time.monotonic()
+                for k in [k for k, v in rcon_cache.items() if v[0] <= now]:
+                    del rcon_cache[k]
+                rcon_cache[key] = (now + config.mc_conn_rcon_cache_ttl, task.result())
+        rcon_inflight[key] = asyncio.create_task(_send_rcon_cmd(mcbot, command))
+        rcon_inflight[key].add_done_callback(on_done)
+    return await asyncio.shield(rcon_inflight[key])
+
+async def send_rcon_batch(mcbot: MCBot, commands: list[str], cache: bool = False):
+    return await asyncio.gather(*[send_rcon(mcbot, command, cache) for command in commands])
 
 help_msg = """
 /mcc [server-name] - 切换到指定服务器
@@ -73,8 +151,6 @@ help_msg = """
 /mcc.time - 查询服务器时间
 """
 
-player_server_map = dict[str, str]()
-
 @group_cmd_handler.handle()
 async def _(
     bot: OneBot,
@@ -87,14 +163,14 @@ async def _(
     if len(enabled_servers) == 1:
         present_server = enabled_servers[0]
     else:
-        present_server = player_server_map.get(event.get_session_id())
+        present_server = await state.get(f"mcc-server:{event.get_session_id()}")
     if len(cmd) == 1:
         if not parsed_args:
             msg = help_msg[1:] + "\n可用服务器: " + ", ".join(enabled_servers)
             if present_server:
                 msg += f"\n当前服务器: {present_server}"
         elif parsed_args[0] in enabled_servers:
-            player_server_map[event.get_session_id()] = parsed_args[0]
+            await state.set(f"mcc-server:{event.get_session_id()}", parsed_args[0])
             msg = f"已切换到服务器: {parsed_args[0]}"
         else:
             msg = "服务器不存在"
@@ -110,9 +186,13 @@ async def _(
             await group_cmd_handler.finish("请输入要发送的消息内容", reply_message=True)
         name = event.sender.card or event.sender.nickname
         await mcbot.send_msg(message=f"<Group {name}> " + " ".join(parsed_args))
-        await bot.call_api("group_poke", group_id=event.group_id, user_id=event.user_id)
+        scheduler.submit(
+            event.group_id,
+            lambda: bot.call_api("group_poke", group_id=event.group_id, user_id=event.user_id),
+            Priority.REPLY
+        )
     elif cmd[1] == "time":
-        res = await mcbot.send_rcon_cmd(command="time query gametime")
+        res = await send_rcon(mcbot, "time query gametime", cache=True)
         gametime = int(res[0].removeprefix("The time is "))
         day, daytime = divmod(gametime, 24000)
         hour, minute = divmod(daytime, 1000)
@@ -121,7 +201,7 @@ async def _(
         await group_cmd_handler.finish(f"当前游戏时间: {day}天 {f_hour}:{f_minute}", reply_message=True)
     elif cmd[1] == "player":
         if not parsed_args:
-            res = await mcbot.send_rcon_cmd(command="list")
+            res = await send_rcon(mcbot, "list", cache=True)
             await group_cmd_handler.finish(
                 f"当前玩家列表：{res[0].split(': ')[1].strip()}",
                 reply_message=True
@@ -129,8 +209,10 @@ async def _(
         c = {"Health": "", "XpLevel": "", "Pos": ""}
         try:
             player = parsed_args[0]
-            for i in c:
-                data = await mcbot.send_rcon_cmd(command=f"data get entity {player} {i}")
+            results = await send_rcon_batch(
+                mcbot, [f"data get entity {player} {i}" for i in c], cache=True
+            )
+            for i, data in zip(c, results):
                 c[i] = data[0].split(": ")[1].strip()
             text = f"玩家{player}信息：\n"
             text += f"生命值: {c['Health'].removesuffix('f')}\n"
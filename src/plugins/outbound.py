@@ -0,0 +1,147 @@
+import time
+import bisect
+import asyncio
+import contextvars
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Hashable
+from pydantic import BaseModel
+
+from nonebot import get_plugin_config, logger
+from nonebot.message import event_preprocessor
+from nonebot.adapters.onebot.v11 import GroupRecallNoticeEvent
+
+class Config(BaseModel):
+    outbound_global_rate: float = 5
+    outbound_global_burst: int = 10
+    outbound_group_rate: float = 1
+    outbound_group_burst: int = 3
+
+config = get_plugin_config(Config)
+
+class Priority(IntEnum):
+    REPLY = 0
+    RELAY = 1
+    AMBIENT = 2
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def delay(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class OutboundItem:
+    def __init__(
+            self,
+            group_id: int,
+            call: Callable[[], Awaitable[Any]],
+            key: Hashable,
+            not_before: float
+        ):
+        self.group_id = group_id
+        self.call = call
+        self.key = key
+        self.not_before = not_before
+        self.context = contextvars.copy_context()
+        self.future = asyncio.get_running_loop().create_future()
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+class Scheduler:
+    # all proactive group sends go through here; replies from matcher.finish in command handlers
+    # are deliberately left out, they answer an explicit command and end the matcher immediately
+    def __init__(self):
+        self.queue = list[tuple[int, int, OutboundItem]]()
+        self.global_bucket = TokenBucket(config.outbound_global_rate, config.outbound_global_burst)
+        self.group_buckets = dict[int, TokenBucket]()
+        self.sending = set[int]()
+        self._seq = 0
+        self._wakeup: asyncio.Event = None
+        self._worker: asyncio.Task = None
+
+    def _group_bucket(self, group_id: int):
+        if group_id not in self.group_buckets:
+            self.group_buckets[group_id] = TokenBucket(config.outbound_group_rate, config.outbound_group_burst)
+        return self.group_buckets[group_id]
+
+    def submit(
+            self,
+            group_id: int,
+            call: Callable[[], Awaitable[Any]],
+            priority: Priority = Priority.REPLY,
+            key: Hashable = None,
+            delay: float = 0
+        ):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        item = OutboundItem(int(group_id), call, key, time.monotonic() + delay)
+        self._seq += 1
+        bisect.insort(self.queue, (priority, self._seq, item))
+        self._wakeup.set()
+        return item.future
+
+    def discard(self, group_id: int, key: Hashable):
+        for entry in [e for e in self.queue if e[2].group_id == group_id and e[2].key == key]:
+            logger.info(f"discard outbound item {key} in group {group_id}")
+            self.queue.remove(entry)
+            entry[2].future.cancel()
+
+    async def _send(self, item: OutboundItem):
+        try:
+            item.future.set_result(await item.call())
+        except Exception as e:
+            logger.warning(f"outbound call failed: {e!r}")
+            item.future.set_exception(e)
+        finally:
+            self.sending.discard(item.group_id)
+            self._wakeup.set()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        wait = self.global_bucket.delay(now)
+        if wait:
+            return wait
+        # one send in flight per group, and parts sharing a key never overtake each other
+        waiting = set[tuple[int, Hashable]]()
+        for entry in self.queue:
+            item = entry[2]
+            if item.group_id in self.sending or (item.group_id, item.key) in waiting:
+                continue
+            bucket = self._group_bucket(item.group_id)
+            item_wait = max(item.not_before - now, bucket.delay(now))
+            if item_wait <= 0:
+                self.queue.remove(entry)
+                self.global_bucket.take()
+                bucket.take()
+                self.sending.add(item.group_id)
+                item.context.run(asyncio.create_task, self._send(item))
+                return 0
+            if item.key is not None:
+                waiting.add((item.group_id, item.key))
+            wait = min(wait, item_wait) if wait else item_wait
+        return wait or None
+
+    async def _run(self):
+        while True:
+            wait = self._dispatch() if self.queue else None
+            if wait == 0:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+scheduler = Scheduler()
+
+@event_preprocessor
+async def _(event: GroupRecallNoticeEvent):
+    scheduler.discard(event.group_id, event.message_id)
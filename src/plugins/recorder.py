@@ -1,22 +1,96 @@
+import sys
+from typing import Callable
 from pydantic import BaseModel
 
 from nonebot import get_plugin_config, logger
+from nonebot.compat import type_validate_python
 from nonebot.message import event_preprocessor
-from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, GroupRecallNoticeEvent
+from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, GroupRecallNoticeEvent, Message
 
 class Config(BaseModel):
     recorder_max_history_length: int = 100
 
 config = get_plugin_config(Config)
 
+class MessageRecord:
+    __slots__ = (
+        "message_id", "group_id", "user_id", "time",
+        "card", "nickname", "role",
+        "message", "rich_text", "repeat_hash"
+    )
+    def __init__(
+            self,
+            message_id: int,
+            group_id: int,
+            user_id: int,
+            time: int,
+            card: str,
+            nickname: str,
+            role: str,
+            message: Message
+        ):
+        self.message_id = message_id
+        self.group_id = group_id
+        self.user_id = user_id
+        self.time = time
+        self.card = card
+        self.nickname = nickname
+        self.role = role
+        self.message = message
+        self.rich_text = message.to_rich_text()
+        self.repeat_hash = hash(self.rich_text)
+
+    @classmethod
+    def from_event(cls, event: GroupMessageEvent):
+        return cls(
+            event.message_id, event.group_id, event.user_id, event.time,
+            event.sender.card, event.sender.nickname, event.sender.role,
+            event.original_message
+        )
+
+    @classmethod
+    def from_dict(cls, msg: dict[str]):
+        sender: dict[str] = msg.get("sender") or {}
+        return cls(
+            msg["message_id"], msg["group_id"], msg["user_id"], msg["time"],
+            sender.get("card"), sender.get("nickname"), sender.get("role"),
+            type_validate_python(Message, msg["message"])
+        )
+
+    @property
+    def sender_name(self):
+        return self.card or self.nickname
+
+def _deep_sizeof(obj, seen: set[int]):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(i, seen) for i in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(_deep_sizeof(getattr(obj, i, None), seen) for i in obj.__slots__)
+    elif hasattr(obj, "__dict__"):
+        size += _deep_sizeof(vars(obj), seen)
+    return size
+
 class Recorder:
     _recorders = dict[int, 'Recorder']()
+    _listeners = list[tuple[Callable[[int, MessageRecord], None], Callable[[int, int], None]]]()
     def __init__(self, group_id: int):
         self.group_id = group_id
-        self.msg_history = list[GroupMessageEvent]()
+        self.msg_history = list[MessageRecord]()
+        self._records = dict[int, MessageRecord]()
         self.last_msg: str = None
+        self.last_hash: int = None
         self.msg_repeat_count = 0
 
+    @classmethod
+    def add_listener(cls, on_append: Callable[[int, MessageRecord], None], on_delete: Callable[[int, int], None]):
+        cls._listeners.append((on_append, on_delete))
+
     @classmethod
     async def get(cls, group_id: int, bot: Bot):
         recorder = cls._recorders.get(group_id)
@@ -31,42 +105,55 @@ class Recorder:
             for msg in response["messages"]:
                 if not msg["message"]:
                     continue
-                msg["post_type"] = "message"
-                recorder.append(GroupMessageEvent(**msg))
-            logger.info(f"get {len(recorder.msg_history)} messages from group {group_id}")
+                msg.setdefault("group_id", group_id)
+                recorder.append(MessageRecord.from_dict(msg))
+            logger.info(f"get {len(recorder.msg_history)} messages from group {group_id}, "
+                        f"{recorder.memory_usage() / 1024:.1f} KiB per 1k messages")
         return recorder
 
     def get_msg(self, message_id: int):
-        return next((e for e in self.msg_history if e.message_id == message_id), None)
+        return self._records.get(message_id)
 
-    def append(self, event: GroupMessageEvent):
-        if not self.get_msg(event.message_id):
-            self.msg_history.append(event)
+    def append(self, record: MessageRecord):
+        if record.message_id not in self._records:
+            self.msg_history.append(record)
+            self._records[record.message_id] = record
             if len(self.msg_history) > config.recorder_max_history_length:
-                self.msg_history.pop(0)
-            if (msg_text := event.original_message.to_rich_text()) == self.last_msg:
+                del self._records[self.msg_history.pop(0).message_id]
+            for on_append, _ in self._listeners:
+                on_append(self.group_id, record)
+            if record.repeat_hash == self.last_hash and record.rich_text == self.last_msg:
                 self.msg_repeat_count += 1
             else:
                 self.msg_repeat_count = 1
-                self.last_msg = msg_text
+                self.last_msg = record.rich_text
+                self.last_hash = record.repeat_hash
 
     def delete(self, message_id: int):
-        for idx, msg in enumerate(self.msg_history):
-            if msg.message_id == message_id:
-                logger.info(f"delete message {message_id} from group {self.group_id}")
-                self.msg_history.pop(idx)
-                if len(self.msg_history) - idx <= self.msg_repeat_count:
-                    self.msg_repeat_count -= 1
-
-    def get_reply_msg(self, event: GroupMessageEvent):
-        for msg_seg in event.original_message:
+        if (record := self._records.pop(message_id, None)) is None:
+            return
+        idx = self.msg_history.index(record)
+        logger.info(f"delete message {message_id} from group {self.group_id}")
+        self.msg_history.pop(idx)
+        if len(self.msg_history) - idx <= self.msg_repeat_count:
+            self.msg_repeat_count -= 1
+        for _, on_delete in self._listeners:
+            on_delete(self.group_id, message_id)
+
+    def get_reply_msg(self, record: MessageRecord):
+        for msg_seg in record.message:
             if msg_seg.type == "reply":
                 return self.get_msg(int(msg_seg.data["id"]))
 
+    def memory_usage(self):
+        if not self.msg_history:
+            return 0
+        return _deep_sizeof(self.msg_history, set()) * 1000 / len(self.msg_history)
+
 @event_preprocessor
 async def _(bot: Bot, event: GroupMessageEvent):
     recorder = await Recorder.get(event.group_id, bot)
-    recorder.append(event)
+    recorder.append(MessageRecord.from_event(event))
 
 @event_preprocessor
 async def _(bot: Bot, event: GroupRecallNoticeEvent):
@@ -82,6 +169,6 @@ async def _(bot, e, api: str, data: dict[str], result):
     if api not in ["send_msg","send_group_msg"]:
         return
     msg_dict = await bot.get_msg(message_id=result["message_id"])
-    msg_dict["post_type"] = "message"
+    msg_dict.setdefault("group_id", data["group_id"])
     recorder = await Recorder.get(data["group_id"], bot)
-    recorder.append(GroupMessageEvent(**msg_dict))
+    recorder.append(MessageRecord.from_dict(msg_dict))
@@ -0,0 +1,103 @@
+from nonebot import require
+
+require("nonebot_plugin_localstore")
+
+import json
+import asyncio
+from abc import ABC, abstractmethod
+from pydantic import BaseModel
+
+from nonebot import get_driver, get_plugin_config, logger
+from nonebot_plugin_localstore import get_plugin_data_file
+
+from src.kvstore import KVClient, MemoryStore
+
+class Config(BaseModel):
+    state_backend: str = "local"
+    state_kv_host: str = "127.0.0.1"
+    state_kv_port: int = 6380
+    state_save_delay: float = 5
+
+config = get_plugin_config(Config)
+
+class StateBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str, default=None): ...
+
+    @abstractmethod
+    async def set(self, key: str, value, ttl: float = None): ...
+
+    @abstractmethod
+    async def delete(self, key: str): ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: float = None) -> int: ...
+
+    async def close(self):
+        pass
+
+class LocalBackend(StateBackend):
+    def __init__(self):
+        self.file = get_plugin_data_file("state.json")
+        self.store = MemoryStore(json.loads(self.file.read_text()) if self.file.exists() else None)
+        self.store.purge()
+        self._save_handle: asyncio.TimerHandle = None
+
+    def _flush(self):
+        self._save_handle = None
+        self.store.purge()
+        self.file.write_text(json.dumps(self.store.data, ensure_ascii=False))
+
+    def _save(self):
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(config.state_save_delay, self._flush)
+
+    async def get(self, key: str, default=None):
+        return self.store.get(key, default)
+
+    async def set(self, key: str, value, ttl: float = None):
+        self.store.set(key, value, ttl)
+        self._save()
+
+    async def delete(self, key: str):
+        self.store.delete(key)
+        self._save()
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None):
+        value = self.store.incr(key, amount, ttl)
+        self._save()
+        return value
+
+    async def close(self):
+        if self._save_handle:
+            self._save_handle.cancel()
+            self._flush()
+
+class KVBackend(StateBackend):
+    def __init__(self, host: str, port: int):
+        self.client = KVClient(host, port)
+
+    async def get(self, key: str, default=None):
+        return await self.client.execute({"op": "get", "key": key, "default": default})
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self.client.execute({"op": "set", "key": key, "value": value, "ttl": ttl})
+
+    async def delete(self, key: str):
+        await self.client.execute({"op": "delete", "key": key})
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None):
+        return await self.client.execute({"op": "incr", "key": key, "amount": amount, "ttl": ttl})
+
+    async def close(self):
+        await self.client.close()
+
+if config.state_backend == "kv":
+    logger.info(f"use kv state backend at {config.state_kv_host}:{config.state_kv_port}")
+    state: StateBackend = KVBackend(config.state_kv_host, config.state_kv_port)
+else:
+    state: StateBackend = LocalBackend()
+
+@get_driver().on_shutdown
+async def _():
+    await state.close()
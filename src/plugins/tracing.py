@@ -0,0 +1,105 @@
+import time
+from bisect import bisect_left
+from itertools import count
+from contextvars import ContextVar
+from pydantic import BaseModel
+
+from nonebot import get_plugin_config, logger, on_command
+from nonebot.permission import SUPERUSER
+from nonebot.adapters.onebot.v11 import Bot, Event
+
+class Config(BaseModel):
+    tracing_slow_event_threshold: float = 0
+
+config = get_plugin_config(Config)
+
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+class ApiStats:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float, error: bool):
+        self.buckets[bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.errors += error
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float):
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= target:
+                return bound
+        return BUCKETS[-1]
+
+class Trace:
+    def __init__(self, trace_id: str, event_name: str):
+        self.trace_id = trace_id
+        self.event_name = event_name
+        self.start = time.perf_counter()
+        self.calls = list[tuple[float, str, float, bool]]()
+
+current_trace = ContextVar[Trace]("current_trace", default=None)
+api_stats = dict[str, ApiStats]()
+_calling = dict[int, float]()
+_trace_ids = count(1)
+
+_handle_event = Bot.handle_event
+
+async def handle_event(self: Bot, event: Event):
+    trace = Trace(f"{self.self_id}-{next(_trace_ids)}", event.get_event_name())
+    token = current_trace.set(trace)
+    try:
+        await _handle_event(self, event)
+    finally:
+        current_trace.reset(token)
+        elapsed = time.perf_counter() - trace.start
+        if config.tracing_slow_event_threshold and elapsed >= config.tracing_slow_event_threshold:
+            timeline = "\n".join(
+                f"  +{offset * 1000:8.1f}ms {api} {ms:.1f}ms{' (error)' if error else ''}"
+                for offset, api, ms, error in trace.calls
+            )
+            logger.warning(f"slow event [{trace.trace_id}] {trace.event_name}: {elapsed * 1000:.1f}ms\n{timeline}")
+
+Bot.handle_event = handle_event
+
+@Bot.on_calling_api
+async def _(bot, api: str, data: dict[str]):
+    _calling[id(data)] = time.perf_counter()
+
+@Bot.on_called_api
+async def _(bot, e, api: str, data: dict[str], result):
+    start = _calling.pop(id(data), None)
+    if start is None:
+        return
+    ms = (time.perf_counter() - start) * 1000
+    api_stats.setdefault(api, ApiStats()).record(ms, e is not None)
+    trace = current_trace.get()
+    if trace:
+        trace.calls.append((start - trace.start, api, ms, e is not None))
+        logger.debug(f"[{trace.trace_id}] {api}: {ms:.1f}ms")
+
+api_stats_cmd = on_command(
+    "api-stats",
+    permission=SUPERUSER,
+    force_whitespace=True,
+    priority=0,
+    block=True
+)
+
+@api_stats_cmd.handle()
+async def _():
+    if not api_stats:
+        await api_stats_cmd.finish("暂无API调用记录", reply_message=True)
+    text = "API调用统计（次数/错误/平均/P50/P95/最大）"
+    for api, stats in sorted(api_stats.items(), key=lambda x: x[1].total_ms, reverse=True):
+        text += f"\n{api}: {stats.count}/{stats.errors}/{stats.total_ms / stats.count:.0f}ms" \
+                f"/≤{stats.percentile(0.5):g}ms/≤{stats.percentile(0.95):g}ms/{stats.max_ms:.0f}ms"
+    await api_stats_cmd.finish(text, reply_message=True)
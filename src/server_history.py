@@ -0,0 +1,113 @@
+import struct
+from array import array
+from pathlib import Path
+
+from nonebot import logger
+
+TIMEZONE = 28800  # UTC+8
+
+class ServerHistory:
+    _header = struct.Struct("<4sII")
+    _magic = b"XFSH"
+    _columns = (("timestamps", "I"), ("latencies", "f"), ("online", "H"), ("max_players", "H"))
+
+    def __init__(self, path: Path, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        for name, typecode in self._columns:
+            setattr(self, name, array(typecode, [0]) * capacity)
+        self.head = 0
+        self.size = 0
+        self.load()
+
+    def append(self, timestamp: int, latency: float, online: int, max_players: int):
+        self.timestamps[self.head] = timestamp
+        self.latencies[self.head] = latency
+        self.online[self.head] = min(online, 0xFFFF)
+        self.max_players[self.head] = min(max_players, 0xFFFF)
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _indexes(self, since: int):
+        for i in range(1, self.size + 1):
+            idx = (self.head - i) % self.capacity
+            if self.timestamps[idx] < since:
+                return
+            yield idx
+
+    def stats(self, since: int):
+        count = up = 0
+        lat_min = lat_max = lat_sum = 0.0
+        on_min = on_max = on_sum = 0
+        for idx in self._indexes(since):
+            count += 1
+            latency = self.latencies[idx]
+            if latency < 0:
+                continue
+            online = self.online[idx]
+            if not up:
+                lat_min = lat_max = latency
+                on_min = on_max = online
+            up += 1
+            lat_min, lat_max = min(lat_min, latency), max(lat_max, latency)
+            on_min, on_max = min(on_min, online), max(on_max, online)
+            lat_sum += latency
+            on_sum += online
+        if not count:
+            return
+        return {
+            "count": count,
+            "up": up,
+            "latency": (lat_min, lat_sum / up if up else 0.0, lat_max),
+            "online": (on_min, on_sum / up if up else 0.0, on_max)
+        }
+
+    def peak_hours(self, since: int, top: int = 3):
+        sums = array("d", [0.0]) * 24
+        counts = array("I", [0]) * 24
+        for idx in self._indexes(since):
+            if self.latencies[idx] < 0:
+                continue
+            hour = (self.timestamps[idx] + TIMEZONE) // 3600 % 24
+            sums[hour] += self.online[idx]
+            counts[hour] += 1
+        averages = [(sums[h] / counts[h], h) for h in range(24) if counts[h]]
+        averages.sort(reverse=True)
+        return [(h, avg) for avg, h in averages[:top]]
+
+    def _ordered(self, column: array):
+        if self.size < self.capacity:
+            return column[:self.size]
+        return column[self.head:] + column[:self.head]
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("wb") as wf:
+            wf.write(self._header.pack(self._magic, self.capacity, self.size))
+            for name, _ in self._columns:
+                self._ordered(getattr(self, name)).tofile(wf)
+        tmp_path.replace(self.path)
+
+    def load(self):
+        if not self.path.exists():
+            return
+        data = self.path.read_bytes()
+        if len(data) < self._header.size:
+            logger.warning(f"ignore truncated server history {self.path}")
+            return
+        magic, _, size = self._header.unpack_from(data)
+        if magic != self._magic:
+            return
+        if len(data) != self._header.size + size * sum(array(t).itemsize for _, t in self._columns):
+            logger.warning(f"ignore server history {self.path} with mismatched length")
+            return
+        keep = min(size, self.capacity)
+        offset = self._header.size
+        for name, typecode in self._columns:
+            column = array(typecode)
+            column.frombytes(data[offset:offset + size * column.itemsize])
+            offset += size * column.itemsize
+            getattr(self, name)[:keep] = column[size - keep:]
+        self.size = keep
+        self.head = keep % self.capacity
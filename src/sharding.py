@@ -0,0 +1,14 @@
+import bisect
+import hashlib
+
+def _hash(key: str):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+class HashRing:
+    def __init__(self, nodes: list[str], replicas: int = 160):
+        self.ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [h for h, _ in self.ring]
+
+    def get(self, key) -> str:
+        idx = bisect.bisect(self._keys, _hash(str(key))) % len(self.ring)
+        return self.ring[idx][1]
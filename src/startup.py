@@ -0,0 +1,69 @@
+import time
+import asyncio
+import importlib
+from contextlib import contextmanager
+
+import nonebot
+from nonebot import logger
+from nonebot.plugin.manager import PluginLoader
+
+timings = dict[str, dict[str, float]]()
+
+def record(name: str, phase: str, seconds: float):
+    timings.setdefault(name, {})[phase] = timings.get(name, {}).get(phase, 0) + seconds
+
+@contextmanager
+def timed(name: str, phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, phase, time.perf_counter() - start)
+
+_exec_module = PluginLoader.exec_module
+_nested = list[float]()
+
+def _timed_exec_module(self: PluginLoader, module):
+    # plugins imported by another plugin are loaded inside its exec_module, only count self time
+    loaded = self.loaded
+    _nested.append(0)
+    start = time.perf_counter()
+    try:
+        _exec_module(self, module)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = _nested.pop()
+        if _nested:
+            _nested[-1] += elapsed
+        if not loaded:
+            record(self.name, "import", elapsed - nested)
+
+def load_from_toml(file_path: str):
+    PluginLoader.exec_module = _timed_exec_module
+    try:
+        return nonebot.load_from_toml(file_path)
+    finally:
+        PluginLoader.exec_module = _exec_module
+
+def report():
+    lines = []
+    for name, phases in sorted(timings.items(), key=lambda x: sum(x[1].values()), reverse=True):
+        detail = " ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in phases.items())
+        lines.append(f"{sum(phases.values()) * 1000:8.1f}ms  {name}  ({detail})")
+    logger.info("startup timing report:\n" + "\n".join(lines))
+
+async def _warm_up(modules: tuple[str, ...]):
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(importlib.import_module, name)
+        except ImportError as e:
+            logger.warning(f"warm up {name} failed: {e!r}")
+            continue
+        logger.info(f"warm up {name}: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+_warm_up_task: asyncio.Task = None
+
+def warm_up(*modules: str):
+    global _warm_up_task
+    _warm_up_task = asyncio.create_task(_warm_up(modules))
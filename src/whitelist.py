@@ -0,0 +1,10 @@
+from nonebot import get_driver
+from nonebot.exception import IgnoredException
+from nonebot.adapters.onebot.v11 import Event
+
+def is_enabled_group(event: Event):
+    if not hasattr(event, "group_id"):
+        return
+    config = get_driver().config
+    if config.whitelist_mode ^ (event.group_id in config.namelist):
+        raise IgnoredException("group not enabled")
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import nonebot
+from nonebot.adapters.onebot.v11 import Adapter
+
+_temp_dir = TemporaryDirectory()
+nonebot.init(
+    driver="~none",
+    log_level="WARNING",
+    state_backend="local",
+    localstore_data_dir=f"{_temp_dir.name}/data",
+    localstore_config_dir=f"{_temp_dir.name}/config",
+    localstore_cache_dir=f"{_temp_dir.name}/cache"
+)
+nonebot.get_driver().register_adapter(Adapter)
+nonebot.load_plugin("nonebot_plugin_group_config")
+nonebot.load_plugins("src/plugins")
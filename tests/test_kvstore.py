@@ -0,0 +1,68 @@
+import json
+import time
+import asyncio
+
+import pytest
+
+from src.kvstore import KVClient, MemoryStore, serve
+
+def test_memory_store_ttl_and_purge():
+    store = MemoryStore(purge_interval=0)
+    store.set("a", 1, ttl=0.01)
+    store.set("b", 2)
+    assert store.incr("c", ttl=60) == 1
+    assert store.incr("c") == 2
+    time.sleep(0.02)
+    assert store.get("a") is None
+    store.set("d", 3)
+    assert set(store.data) == {"b", "c", "d"}
+
+def test_memory_store_unknown_op():
+    with pytest.raises(ValueError):
+        MemoryStore().execute({"op": "flush"})
+
+async def _with_server(func):
+    server = await serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = KVClient("127.0.0.1", port)
+    try:
+        return await func(client)
+    finally:
+        await client.close()
+        server.close()
+
+def test_client_roundtrip():
+    async def run(client: KVClient):
+        await client.execute({"op": "set", "key": "k", "value": {"x": [1, 2]}})
+        assert await client.execute({"op": "get", "key": "k"}) == {"x": [1, 2]}
+        assert await asyncio.gather(*[client.execute({"op": "incr", "key": "n"}) for _ in range(5)]) == [1, 2, 3, 4, 5]
+        await client.execute({"op": "delete", "key": "k"})
+        assert await client.execute({"op": "get", "key": "k", "default": 0}) == 0
+        with pytest.raises(RuntimeError):
+            await client.execute({"op": "flush"})
+    asyncio.run(_with_server(run))
+
+def test_lost_reply_only_retries_idempotent_ops():
+    store = MemoryStore()
+    received = []
+
+    async def drop_reply(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # apply the request, then lose the connection before answering
+        received.append(json.loads(await reader.readline()))
+        store.execute(received[-1])
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(drop_reply, "127.0.0.1", 0)
+        client = KVClient("127.0.0.1", server.sockets[0].getsockname()[1])
+        try:
+            with pytest.raises(OSError):
+                await client.execute({"op": "incr", "key": "n"})
+            assert store.get("n") == 1 and len(received) == 1
+            with pytest.raises(OSError):
+                await client.execute({"op": "get", "key": "n"})
+            assert len(received) == 3
+        finally:
+            await client.close()
+            server.close()
+    asyncio.run(run())
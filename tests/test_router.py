@@ -0,0 +1,67 @@
+import json
+import asyncio
+
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+
+from router import route
+from src.sharding import HashRing
+
+async def _recv(ws, timeout: float = 1):
+    return json.loads(await asyncio.wait_for(ws.recv(), timeout))
+
+async def _run(test, api_timeout: float = 60):
+    workers = [asyncio.Queue(), asyncio.Queue()]
+    connections = [asyncio.get_running_loop().create_future() for _ in workers]
+
+    def worker_handler(idx: int):
+        async def handler(ws):
+            connections[idx].set_result(ws)
+            async for raw in ws:
+                await workers[idx].put(json.loads(raw))
+        return handler
+
+    worker_servers = [await serve(worker_handler(i), "127.0.0.1", 0) for i in range(len(workers))]
+    urls = [f"ws://127.0.0.1:{s.sockets[0].getsockname()[1]}" for s in worker_servers]
+    router_server = await serve(lambda ws: route(ws, urls, api_timeout), "127.0.0.1", 0)
+    try:
+        async with connect(f"ws://127.0.0.1:{router_server.sockets[0].getsockname()[1]}") as onebot:
+            await test(onebot, workers, [await c for c in connections])
+    finally:
+        router_server.close()
+        for s in worker_servers:
+            s.close()
+
+def test_events_routed_by_group():
+    async def test(onebot, workers, _):
+        ring = HashRing(["0", "1"])
+        for group_id in range(1, 20):
+            await onebot.send(json.dumps({"post_type": "message", "group_id": group_id}))
+            event = await asyncio.wait_for(workers[int(ring.get(group_id))].get(), 1)
+            assert event["group_id"] == group_id
+        await onebot.send(json.dumps({"post_type": "meta_event"}))
+        for queue in workers:
+            assert (await asyncio.wait_for(queue.get(), 1))["post_type"] == "meta_event"
+    asyncio.run(_run(test))
+
+def test_echo_rewritten_back_to_caller():
+    async def test(onebot, workers, worker_ws):
+        await worker_ws[1].send(json.dumps({"action": "get_status", "echo": "w1"}))
+        call = await _recv(onebot)
+        assert call["echo"] != "w1"
+        await onebot.send(json.dumps({"status": "ok", "echo": call["echo"]}))
+        assert (await asyncio.wait_for(workers[1].get(), 1))["echo"] == "w1"
+        assert workers[0].empty()
+    asyncio.run(_run(test))
+
+def test_unanswered_calls_expire():
+    async def test(onebot, workers, worker_ws):
+        await worker_ws[0].send(json.dumps({"action": "a", "echo": "first"}))
+        first = await _recv(onebot)
+        await asyncio.sleep(0.1)
+        await worker_ws[0].send(json.dumps({"action": "b", "echo": "second"}))
+        second = await _recv(onebot)
+        await onebot.send(json.dumps({"status": "ok", "echo": first["echo"]}))
+        await onebot.send(json.dumps({"status": "ok", "echo": second["echo"]}))
+        assert (await asyncio.wait_for(workers[0].get(), 1))["echo"] == "second"
+    asyncio.run(_run(test, api_timeout=0.05))
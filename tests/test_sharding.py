@@ -0,0 +1,16 @@
+from collections import Counter
+
+from src.sharding import HashRing
+
+def test_distribution_is_balanced():
+    ring = HashRing([str(i) for i in range(4)])
+    counts = Counter(ring.get(group_id) for group_id in range(100000, 120000))
+    assert set(counts) == {"0", "1", "2", "3"}
+    assert max(counts.values()) < 1.3 * min(counts.values())
+
+def test_adding_a_node_moves_few_keys():
+    old = HashRing(["0", "1", "2"])
+    new = HashRing(["0", "1", "2", "3"])
+    moved = [k for k in range(10000) if old.get(k) != new.get(k)]
+    assert all(new.get(k) == "3" for k in moved)
+    assert len(moved) < 10000 * 0.35
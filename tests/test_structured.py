@@ -0,0 +1,43 @@
+from src.plugins.ai_chat.structured import repair_json, validate_preprocess, validate_chat
+
+PREPROCESS = '{"reason":"a","desire":15,"images":{"1":"看图"},"search":["x"],"think":true}'
+
+def test_valid_json():
+    assert repair_json(PREPROCESS)["think"] is True
+
+def test_fenced_json():
+    assert repair_json(f"```json\n{PREPROCESS}\n```")["desire"] == 15
+
+def test_trailing_text():
+    assert repair_json(f"{PREPROCESS}\n注：[完]")["think"] is True
+
+def test_leading_text():
+    assert repair_json(f"[注] {PREPROCESS}")["desire"] == 15
+
+def test_truncated_keeps_tail():
+    data = repair_json(PREPROCESS[:-1])
+    assert data["think"] is True
+    assert data["images"] == {"1": "看图"}
+
+def test_truncated_inside_string():
+    assert repair_json('["你好", "我是')== ["你好", "我是"]
+
+def test_trailing_comma():
+    assert repair_json('{"messages": ["a", "b",],}') == {"messages": ["a", "b"]}
+
+def test_python_literal():
+    assert repair_json("{'desire': 3, 'think': True}") == {"desire": 3, "think": True}
+
+def test_unrepairable():
+    assert repair_json("不需要回复") is None
+    assert validate_preprocess(repair_json('{"reason":"a","des')) is None
+
+def test_validate_preprocess_normalizes():
+    data = validate_preprocess({"desire": "25", "images": ["3"], "search": "q", "think": "是"})
+    assert data == {"reason": "", "desire": 20, "images": {"3": ""}, "search": ["q"], "think": True}
+
+def test_validate_chat():
+    assert validate_chat({"messages": ["a", {"type": "file", "content": "x"}]}) == ["a"]
+    assert validate_chat(repair_json('["a", {"type":"image","content":"cat"}] 以上')) == [
+        "a", {"type": "image", "content": "cat"}
+    ]